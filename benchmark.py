@@ -0,0 +1,167 @@
+import argparse
+import itertools
+import json
+import logging
+import sys
+import time
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, IterableDataset
+import trainer
+from main import load_json
+from utils.data_manager import get_image_loader
+
+
+def setup_parser():
+    parser = argparse.ArgumentParser(description='Benchmarks for the data pipeline.')
+    parser.add_argument('--config', type=str, required=True,
+                        help='Json file of settings.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    decode = subparsers.add_parser('decode', help='Compare image decode backends.')
+    decode.add_argument('--backends', nargs='+',
+                        default=['pil', 'pil_draft', 'torchvision', 'accimage'])
+    decode.add_argument('--samples', type=int, default=200,
+                        help='Number of training images to decode per backend.')
+
+    loader = subparsers.add_parser(
+        'loader', help='Tune DataLoader workers/prefetch/pinning and save them to the config.')
+    loader.add_argument('--modes', nargs='+', default=['train', 'test', 'flip'])
+    loader.add_argument('--workers', nargs='+', type=int, default=[0, 2, 4, 8])
+    loader.add_argument('--prefetch', nargs='+', type=int, default=[2, 4])
+    loader.add_argument('--pin', nargs='+', type=int, default=[0, 1],
+                        help='pin_memory values to try (0/1).')
+    loader.add_argument('--batch_size', type=int, default=128)
+    loader.add_argument('--batches', type=int, default=50,
+                        help='Batches timed per setting, after a warm-up batch.')
+    loader.add_argument('--dry_run', action='store_true',
+                        help='Report the best settings without writing the config.')
+
+    return parser
+
+
+def build_data_manager(args):
+    # The same pipeline as training; loaders are timed here directly, so
+    # batches are not wrapped in a device prefetcher.
+    args = dict(args, prefetch=False)
+    if isinstance(args["seed"], list):
+        args["seed"] = args["seed"][0]
+    return trainer.build_data_manager(args)
+
+
+def bench_decode(args, data_manager):
+    assert data_manager.use_path, "Decode backends only apply to path datasets."
+    rng = np.random.RandomState(0)
+    paths = data_manager._train_data[
+        rng.choice(len(data_manager._train_data), args["samples"], replace=False)
+    ]
+    # Warm the page cache so the first backend does not pay for disk reads.
+    for path in paths:
+        with open(path, "rb") as f:
+            f.read()
+
+    draft_size = args.get("image_draft_size", 256)
+    for backend in args["backends"]:
+        loader = get_image_loader(backend, draft_size)
+        for mode in ("train", "test"):
+            trsf = data_manager.get_transform(mode)
+            try:
+                start = time.perf_counter()
+                for path in paths:
+                    trsf(loader(path))
+                elapsed = time.perf_counter() - start
+            except ImportError as e:
+                logging.info("{:<12} unavailable ({})".format(backend, e))
+                break
+            logging.info(
+                "{:<12} {:<5} {:8.2f} ms/img {:8.1f} img/s".format(
+                    backend, mode, elapsed * 1000 / len(paths), len(paths) / elapsed
+                )
+            )
+
+
+def bench_loader(args, data_manager):
+    classes = np.arange(0, data_manager.get_task_size(0))
+    cuda = torch.cuda.is_available()
+    # Pinning only matters for copies to a GPU; without one it is not
+    # measured and not written, so the default of get_loader still applies.
+    pins = args["pin"] if cuda else [0]
+    best = {}
+    for mode in args["modes"]:
+        dataset = data_manager.get_dataset(
+            classes, source="train" if mode == "train" else "test", mode=mode
+        )
+        results = []
+        for workers, prefetch, pin in itertools.product(
+            args["workers"], args["prefetch"], pins
+        ):
+            if workers == 0 and prefetch != args["prefetch"][0]:
+                continue  # prefetch_factor is unused without workers
+            kwargs = {"prefetch_factor": prefetch} if workers > 0 else {}
+            loader = DataLoader(
+                dataset,
+                batch_size=args["batch_size"],
+                shuffle=not isinstance(dataset, IterableDataset),
+                num_workers=workers,
+                pin_memory=bool(pin),
+                **kwargs
+            )
+            samples, start = 0, None
+            for i, (_, inputs, _) in enumerate(loader):
+                if cuda:
+                    inputs = inputs.cuda(non_blocking=True)
+                if i == 0:
+                    # Worker start-up is paid once per loader, not per batch.
+                    start = time.perf_counter()
+                    continue
+                samples += len(inputs)
+                if i == args["batches"]:
+                    break
+            if cuda:
+                torch.cuda.synchronize()
+            throughput = samples / (time.perf_counter() - start) if samples else 0.0
+            logging.info(
+                "{:<5} workers={:<2} prefetch={:<2} pin={} {:8.1f} samples/s".format(
+                    mode, workers, prefetch if workers > 0 else "-", pin, throughput
+                )
+            )
+            results.append((throughput, workers, prefetch, bool(pin)))
+
+        throughput, workers, prefetch, pin = max(results)
+        best[mode] = {"num_workers": workers, "prefetch_factor": prefetch}
+        if cuda:
+            best[mode]["pin_memory"] = pin
+        logging.info("{:<5} best: {} ({:.1f} samples/s)".format(mode, best[mode], throughput))
+
+    if args["dry_run"]:
+        return
+    with open(args["config"]) as f:
+        param = json.load(f)
+    param.setdefault("loader", {}).update(best)
+    with open(args["config"], "w") as f:
+        json.dump(param, f, indent=4)
+    logging.info("Wrote loader settings to {}".format(args["config"]))
+
+
+def main():
+    args = setup_parser().parse_args()
+    param = load_json(args.config)
+    args = vars(args)
+    for key, value in param.items():
+        args.setdefault(key, value)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(filename)s] => %(message)s",
+        handlers=[logging.StreamHandler(sys.stdout)],
+    )
+    data_manager = build_data_manager(args)
+
+    if args["command"] == "decode":
+        bench_decode(args, data_manager)
+    elif args["command"] == "loader":
+        bench_loader(args, data_manager)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,20 @@
-import copy
 import logging
 import numpy as np
 import torch
 from torch import nn
-from torch.utils.data import DataLoader
-from utils.toolkit import tensor2numpy, accuracy
-from scipy.spatial.distance import cdist
+from utils.toolkit import (
+    tensor2numpy,
+    accuracy,
+    network_fingerprint,
+    confusion_counts,
+    class_tasks,
+)
+from utils.exemplar_selection import select
+from utils.exemplar_memory import ExemplarMemory
+from utils.exemplar_codec import encoded_bytes, get_codec
+from utils.prototypes import PrototypeStore
+from utils.nme import NMEClassifier
+from utils.validation import AsyncValidator
 import torch.nn.functional as F
 import os
 
@@ -21,14 +30,44 @@ class BaseLearner(object):
         self._total_classes = 0
         self._network = None
         self._old_network = None
-        self._data_memory, self._targets_memory = np.array([]), np.array([])
         self.topk = 5
 
         self._memory_size = args["memory_size"]
+        self._memory = ExemplarMemory(
+            self._memory_size,
+            get_codec(args.get("memory_codec", "raw"), **args.get("memory_codec_args", {})),
+            args.get("memory_vectors", "float32"),
+        )
+        # A byte budget replaces `memory_size` when set (see _budget_per_class).
+        self._memory_bytes = args.get("memory_bytes", None)
+        self._exemplar_bytes = None
+        # Features stored with the exemplars are raw extract_vector outputs;
+        # these record the weights of each feature branch they came from.
+        self._branch_fingerprints, self._branch_dims = [], []
+        self._prototypes = PrototypeStore()
+        self._memory_dir = args.get("memory_dir", None)
+        self._selection = args.get("exemplar_selection", "herding")
         self._memory_per_class = args.get("memory_per_class", None)
         self._fixed_memory = args.get("fixed_memory", False)
         self._device = args["device"][0]
         self._multiple_gpus = args["device"]
+        self._validation = AsyncValidator(
+            self._compute_accuracy,
+            self._device,
+            interval=args.get("validation_interval", 5),
+            subset=args.get("validation_subset", "full"),
+            per_class=args.get("validation_per_class", 10),
+            asynchronous=args.get("async_validation", True),
+            seed=args.get("seed", 0),
+        )
+
+    @property
+    def _data_memory(self):
+        return self._memory.data
+
+    @property
+    def _targets_memory(self):
+        return self._memory.targets
 
     @property
     def exemplar_size(self):
@@ -43,6 +82,8 @@ class BaseLearner(object):
             return self._memory_per_class
         else:
             assert self._total_classes != 0, "Total classes is 0"
+            if self._memory_bytes is not None and self._exemplar_bytes is not None:
+                return self._memory_bytes // (self._exemplar_bytes * self._total_classes)
             return self._memory_size // self._total_classes
 
     @property
@@ -53,11 +94,83 @@ class BaseLearner(object):
             return self._network.feature_dim
 
     def build_rehearsal_memory(self, data_manager, per_class):
+        assert not (data_manager.use_path and self._memory.codec.name != "raw"), (
+            "Exemplar codecs need in-memory images; path datasets store paths."
+        )
+        if self._memory_bytes is not None and not self._fixed_memory:
+            per_class = self._budget_per_class(data_manager)
         if self._fixed_memory:
             self._construct_exemplar_unified(data_manager, per_class)
         else:
             self._reduce_exemplar(data_manager, per_class)
             self._construct_exemplar(data_manager, per_class)
+        if self._memory_dir is not None:
+            self._memory.save(self._task_dir(self._cur_task))
+
+    def _budget_per_class(self, data_manager):
+        # Cost of one exemplar: its encoded sample, measured on a few training
+        # images of the current task, plus its stored feature vector.
+        data, _, _ = data_manager.get_dataset(
+            np.arange(self._known_classes, self._known_classes + 1),
+            source="train",
+            mode="test",
+            ret_data=True,
+        )
+        sample_bytes = encoded_bytes(self._memory.codec.encode(data[:32]))
+        if self._memory.vector_dtype == "int8":
+            # One byte per element plus a float32 scale per exemplar.
+            vector_bytes = self.feature_dim + 4
+        else:
+            vector_bytes = 4 * self.feature_dim
+        self._exemplar_bytes = sample_bytes + vector_bytes
+        per_class = self.samples_per_class
+        logging.info(
+            "Memory budget {} MB: {} bytes per exemplar, {} per class".format(
+                self._memory_bytes / 2**20, self._exemplar_bytes, per_class
+            )
+        )
+        return per_class
+
+    def _task_dir(self, task):
+        # Seeds of one run share `memory_dir`; each keeps its own snapshots.
+        return os.path.join(
+            self._memory_dir, "seed_{}".format(self.args["seed"]), "task_{}".format(task)
+        )
+
+    def load_memory(self, directory):
+        """Restore the exemplar memory saved after a task (see `memory_dir`)."""
+        self._memory = ExemplarMemory.load(directory)
+        self._branch_fingerprints, self._branch_dims = [], []
+        self._prototypes.reset(None)
+        logging.info("Loaded {} exemplars from {}".format(len(self._memory), directory))
+
+    def save_state(self, extra=None):
+        """
+        Save the learner after `after_task` (networks, class means, task
+        counters and the other attributes the models keep across tasks) next
+        to the memory of the task, so that `load_state` can resume from it.
+        `extra` (e.g. the trainer's accuracy curves) is stored with it.
+        """
+        state = {
+            key: value for key, value in vars(self).items() if key not in _TRANSIENT
+        }
+        torch.save(
+            {"learner": state, "extra": extra},
+            os.path.join(self._task_dir(self._cur_task), "learner.pt"),
+        )
+
+    def load_state(self, task):
+        """Resume after `task` from `memory_dir`; returns the saved `extra`."""
+        directory = self._task_dir(task)
+        checkpoint = torch.load(
+            os.path.join(directory, "learner.pt"),
+            map_location=self._device,
+            weights_only=False,
+        )
+        vars(self).update(checkpoint["learner"])
+        self.load_memory(directory)
+        logging.info("Resumed after task {} from {}".format(task, directory))
+        return checkpoint["extra"]
 
     def save_checkpoint(self, filename):
         self._network.cpu()
@@ -83,16 +196,17 @@ class BaseLearner(object):
         return ret
 
     def eval_task(self, save_conf=False):
-        if "NCM" in self.args and self.args["NCM"]:
-            y_pred, y_true = self._eval_ncm(self.test_loader, self._protos)
-        else:
-            y_pred, y_true = self._eval_cnn(self.test_loader)
-        cnn_accy = self._evaluate(y_pred, y_true)
-
-        if hasattr(self, "_class_means"):
-            y_pred, y_true = self._eval_nme(self.test_loader, self._class_means)
-            nme_accy = self._evaluate(y_pred, y_true)
+        self._validation.wait()
+        cnn_pred, nme_pred, y_true = self._eval_combined(self.test_loader)
+        cnn_accy = self._evaluate(cnn_pred, y_true)
+        # Top-1 CNN predictions of the last evaluation, for confusion matrices.
+        self._eval_predictions = (cnn_pred[:, 0], y_true)
+
+        if nme_pred is not None:
+            y_pred = nme_pred
+            nme_accy = self._evaluate(nme_pred, y_true)
         else:
+            y_pred = cnn_pred
             nme_accy = None
 
         if save_conf:
@@ -110,6 +224,29 @@ class BaseLearner(object):
 
         return cnn_accy, nme_accy
 
+    def confusion_matrix(self, task_num, file_id):
+        """
+        Write the class and task confusion matrices (rows: true, columns:
+        predicted) of the CNN predictions of the last evaluation to
+        ``./csv/cm_<file_id>`` and ``./csv/cm_task_<file_id>``, as CSV and
+        as ``.npy``.
+        """
+        if getattr(self, "_eval_predictions", None) is None:
+            cnn_pred, _, y_true = self._eval_combined(self.test_loader)
+            self._eval_predictions = (cnn_pred[:, 0], y_true)
+        y_pred, y_true = self._eval_predictions
+        nb_classes = max(self._total_classes, int(max(y_pred.max(), y_true.max())) + 1)
+        matrix = confusion_counts(y_pred, y_true, nb_classes, self._device)
+        tasks = class_tasks(nb_classes, self.args["init_cls"], self.args["increment"])
+        task_num = max(task_num, int(tasks.max()) + 1)
+        matrix_task = confusion_counts(tasks[y_pred], tasks[y_true], task_num, self._device)
+
+        os.makedirs("./csv", exist_ok=True)
+        for name, counts in (("cm_", matrix), ("cm_task_", matrix_task)):
+            path = os.path.join("./csv", name + file_id)
+            np.savetxt(path + ".csv", counts, fmt="%d", delimiter=",")
+            np.save(path + ".npy", counts)
+
     def incremental_train(self):
         pass
 
@@ -117,10 +254,7 @@ class BaseLearner(object):
         pass
 
     def _get_memory(self):
-        if len(self._data_memory) == 0:
-            return None
-        else:
-            return (self._data_memory, self._targets_memory)
+        return self._memory.get()
 
     def _compute_accuracy(self, model, loader):
         model.eval()
@@ -130,275 +264,234 @@ class BaseLearner(object):
             with torch.no_grad():
                 outputs = model(inputs)["logits"]
             predicts = torch.max(outputs, dim=1)[1]
-            correct += (predicts.cpu() == targets).sum()
+            # Counted on the device; one synchronization at the end.
+            correct += (predicts == targets.to(self._device)).sum()
             total += len(targets)
 
         return np.around(tensor2numpy(correct) * 100 / total, decimals=2)
-    
-
-    def _eval_cnn(self, loader):
-        self._network.eval()
-        y_pred, y_true = [], []
-        for _, (_, inputs, targets) in enumerate(loader):
-            inputs = inputs.to(self._device)
-            with torch.no_grad():
-                outputs = self._network(inputs)["logits"]
-            predicts = torch.topk(
-                outputs, k=self.topk, dim=1, largest=True, sorted=True
-            )[
-                1
-            ]  # [bs, topk]
-            y_pred.append(predicts.cpu().numpy())
-            y_true.append(targets.cpu().numpy())
-
-        return np.concatenate(y_pred), np.concatenate(y_true)  # [N, topk]
-
-    def _eval_nme(self, loader, class_means):
-        self._network.eval()
-        vectors, y_true = self._extract_vectors(loader)
-        vectors = (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
 
-        dists = cdist(class_means, vectors, "sqeuclidean")  # [nb_classes, N]
-        scores = dists.T  # [N, nb_classes], choose the one with the smallest distance
-
-        return np.argsort(scores, axis=1)[:, : self.topk], y_true  # [N, topk]
-    
-    def _eval_ncm(self, loader, class_means):
-        class_means_ = []
-        self._network.eval()
-        vectors, y_true = self._extract_vectors(loader)
-        vectors = (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
-
-        class_means = F.normalize(torch.stack(class_means), p=2, dim=-1)
-        for means in class_means:
-            class_means_.append(means.cpu().numpy())
-
-        dists = cdist(class_means_, vectors, "sqeuclidean")  # [nb_classes, N]
-        scores = dists.T  # [N, nb_classes], choose the one with the smallest distance
-
-        return np.argsort(scores, axis=1)[:, :1], y_true  # [N, topk]
-
-    def _extract_vectors(self, loader):
+    def _eval_combined(self, loader):
+        """
+        CNN and NME predictions from a single pass over `loader`: logits and
+        features come from the same forward. With ``NCM`` the CNN predictions
+        are those of the prototypes `_protos`; the NME ones are None when
+        there are no `_class_means`.
+        """
+        if "NCM" in self.args and self.args["NCM"]:
+            ncm = NMEClassifier(
+                F.normalize(torch.stack(self._protos), p=2, dim=-1), self._device
+            )
+            heads = [lambda outputs: ncm.predict(outputs["features"], 1)]
+        else:
+            heads = [
+                lambda outputs: torch.topk(
+                    outputs["logits"], k=self.topk, dim=1, largest=True, sorted=True
+                )[1]
+            ]
+        if hasattr(self, "_class_means"):
+            nme = NMEClassifier(self._class_means, self._device)
+            heads.append(lambda outputs: nme.predict(outputs["features"], self.topk))
+
+        y_pred, y_true = self._eval_stream(loader, heads)
+        nme_pred = y_pred[1] if len(y_pred) > 1 else None
+        return y_pred[0], nme_pred, y_true
+
+    def _eval_stream(self, loader, heads):
+        """
+        One pass of `loader` through the network. Each of `heads` maps the
+        outputs of a batch (logits and features) to [batch, k] predictions
+        on the device, so only the predictions of every head and the targets
+        are kept, never the features. Returns ([N, k] per head, [N]).
+        """
         self._network.eval()
-        vectors, targets = [], []
-        for _, _inputs, _targets in loader:
-            _targets = _targets.numpy()
-            if isinstance(self._network, nn.DataParallel):
-                _vectors = tensor2numpy(
-                    self._network.module.extract_vector(_inputs.to(self._device))
-                )
-            else:
-                _vectors = tensor2numpy(
-                    self._network.extract_vector(_inputs.to(self._device))
-                )
-
-            vectors.append(_vectors)
-            targets.append(_targets)
-
-        return np.concatenate(vectors), np.concatenate(targets)
-
-    def _reduce_exemplar(self, data_manager, m):
-        logging.info("Reducing exemplars...({} per classes)".format(m))
-        dummy_data, dummy_targets = copy.deepcopy(self._data_memory), copy.deepcopy(
-            self._targets_memory
+        y_pred, y_true = [[] for _ in heads], []
+        with torch.no_grad():
+            for _, inputs, targets in loader:
+                outputs = self._network(inputs.to(self._device))
+                for predicts, head in zip(y_pred, heads):
+                    predicts.append(head(outputs))
+                y_true.append(targets.cpu().numpy())
+
+        y_pred = [torch.cat(predicts).cpu().numpy() for predicts in y_pred]
+        return y_pred, np.concatenate(y_true)
+
+    def _feature_branches(self):
+        """
+        (module, feature function) per independently trained part of the
+        feature extractor, in the order extract_vector concatenates them:
+        one per convnet for DER/FOSTER, otherwise the whole backbone.
+        """
+        network = (
+            self._network.module
+            if isinstance(self._network, nn.DataParallel)
+            else self._network
         )
-        self._class_means = np.zeros((self._total_classes, self.feature_dim))
-        self._data_memory, self._targets_memory = np.array([]), np.array([])
-
-        for class_idx in range(self._known_classes):
-            mask = np.where(dummy_targets == class_idx)[0]
-            dd, dt = dummy_data[mask][:m], dummy_targets[mask][:m]
-            self._data_memory = (
-                np.concatenate((self._data_memory, dd))
-                if len(self._data_memory) != 0
-                else dd
+        if hasattr(network, "convnets"):
+            return [
+                (convnet, lambda x, convnet=convnet: convnet(x)["features"])
+                for convnet in network.convnets
+            ]
+        return [(getattr(network, "convnet", network), network.extract_vector)]
+
+    def _extract_branch_vectors(self, loader, branches):
+        # Raw (unnormalized) features of each of `branches`, one pass over `loader`.
+        self._network.eval()
+        vectors = [[] for _ in branches]
+        with torch.no_grad():
+            for _, _inputs, _ in loader:
+                _inputs = _inputs.to(self._device)
+                for b, (_, extract) in enumerate(branches):
+                    vectors[b].append(tensor2numpy(extract(_inputs)))
+        return [np.concatenate(v) for v in vectors]
+
+    def _memory_vectors(self, data_manager):
+        """
+        Raw features of all exemplars under the current network. Stored
+        features are reused per branch; only branches whose weights changed
+        since (or that are new, e.g. DER's latest convnet) are re-extracted,
+        in one pass over the memory.
+        """
+        branches = self._feature_branches()
+        fingerprints = [network_fingerprint(module) for module, _ in branches]
+        stored = self._memory.vectors
+        if len(self._memory) == 0:
+            self._branch_fingerprints = fingerprints
+            return None
+        stale = [
+            b
+            for b, fingerprint in enumerate(fingerprints)
+            if stored is None
+            or b >= len(self._branch_fingerprints)
+            or fingerprint != self._branch_fingerprints[b]
+        ]
+        if len(stale) > 0:
+            memory_dataset = data_manager.get_dataset(
+                [], source="train", mode="test", appendent=self._get_memory()
             )
-            self._targets_memory = (
-                np.concatenate((self._targets_memory, dt))
-                if len(self._targets_memory) != 0
-                else dt
+            memory_loader = data_manager.get_loader(
+                memory_dataset, batch_size=batch_size, shuffle=False, num_workers=4
             )
-
-            # Exemplar mean
-            idx_dataset = data_manager.get_dataset(
-                [], source="train", mode="test", appendent=(dd, dt)
+            fresh = self._extract_branch_vectors(
+                memory_loader, [branches[b] for b in stale]
             )
-            idx_loader = DataLoader(
-                idx_dataset, batch_size=batch_size, shuffle=False, num_workers=4
+            offsets = np.cumsum([0] + self._branch_dims)
+            columns = [
+                fresh[stale.index(b)]
+                if b in stale
+                else stored[:, offsets[b] : offsets[b + 1]]
+                for b in range(len(branches))
+            ]
+            self._memory.replace_vectors(np.concatenate(columns, axis=1))
+            self._branch_dims = [column.shape[1] for column in columns]
+            logging.info(
+                "Re-extracted branches {} of {} for {} exemplars".format(
+                    stale, len(branches), len(self._memory)
+                )
             )
-            vectors, _ = self._extract_vectors(idx_loader)
-            vectors = (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
-            mean = np.mean(vectors, axis=0)
-            mean = mean / np.linalg.norm(mean)
+        self._branch_fingerprints = fingerprints
+        return self._memory.vectors
+
+    def _sync_prototypes(self, data_manager):
+        # Bring memory features and prototypes up to date with the network.
+        vectors = self._memory_vectors(data_manager)
+        if self._prototypes.version != self._branch_fingerprints:
+            self._prototypes.reset(self._branch_fingerprints)
+            if vectors is not None:
+                classes, counts = self._memory.segments()
+                self._prototypes.add_segments(classes, _normalize(vectors), counts)
+        return vectors
 
-            self._class_means[class_idx, :] = mean
+    def _reduce_exemplar(self, data_manager, m):
+        logging.info("Reducing exemplars...({} per classes)".format(m))
+        vectors = self._sync_prototypes(data_manager)
+        if vectors is not None:
+            # Prototypes drop the exemplars that are dropped from the memory:
+            # all rows past the first m of their class slot, in one reduction.
+            classes, counts = self._memory.segments()
+            counts = np.asarray(counts)
+            starts = np.repeat(np.cumsum(counts) - counts, counts)
+            dropped = np.arange(len(vectors)) - starts >= m
+            self._prototypes.add_segments(
+                classes, _normalize(vectors), counts, mask=dropped, sign=-1
+            )
+        self._memory.reduce(m)
+        self._class_means = self._prototypes.means(self._total_classes, self.feature_dim)
 
     def _construct_exemplar(self, data_manager, m):
         logging.info("Constructing exemplars...({} per classes)".format(m))
-        for class_idx in range(self._known_classes, self._total_classes):
-            data, targets, idx_dataset = data_manager.get_dataset(
-                np.arange(class_idx, class_idx + 1),
-                source="train",
-                mode="test",
-                ret_data=True,
-            )
-            idx_loader = DataLoader(
-                idx_dataset, batch_size=batch_size, shuffle=False, num_workers=4
-            )
-            vectors, _ = self._extract_vectors(idx_loader)
-            vectors = (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
-            class_mean = np.mean(vectors, axis=0)
-
-            # Select
-            selected_exemplars = []
-            exemplar_vectors = []  # [n, feature_dim]
-            for k in range(1, m + 1):
-                S = np.sum(
-                    exemplar_vectors, axis=0
-                )  # [feature_dim] sum of selected exemplars vectors
-                mu_p = (vectors + S) / k  # [n, feature_dim] sum to all vectors
-                i = np.argmin(np.sqrt(np.sum((class_mean - mu_p) ** 2, axis=1)))
-                selected_exemplars.append(
-                    np.array(data[i])
-                )  # New object to avoid passing by inference
-                exemplar_vectors.append(
-                    np.array(vectors[i])
-                )  # New object to avoid passing by inference
-
-                vectors = np.delete(
-                    vectors, i, axis=0
-                )  # Remove it to avoid duplicative selection
-                data = np.delete(
-                    data, i, axis=0
-                )  # Remove it to avoid duplicative selection
-
-            # uniques = np.unique(selected_exemplars, axis=0)
-            # print('Unique elements: {}'.format(len(uniques)))
-            selected_exemplars = np.array(selected_exemplars)
-            exemplar_targets = np.full(m, class_idx)
-            self._data_memory = (
-                np.concatenate((self._data_memory, selected_exemplars))
-                if len(self._data_memory) != 0
-                else selected_exemplars
-            )
-            self._targets_memory = (
-                np.concatenate((self._targets_memory, exemplar_targets))
-                if len(self._targets_memory) != 0
-                else exemplar_targets
-            )
-
-            # Exemplar mean
-            idx_dataset = data_manager.get_dataset(
-                [],
-                source="train",
-                mode="test",
-                appendent=(selected_exemplars, exemplar_targets),
-            )
-            idx_loader = DataLoader(
-                idx_dataset, batch_size=batch_size, shuffle=False, num_workers=4
-            )
-            vectors, _ = self._extract_vectors(idx_loader)
-            vectors = (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
-            mean = np.mean(vectors, axis=0)
-            mean = mean / np.linalg.norm(mean)
-
-            self._class_means[class_idx, :] = mean
+        for class_idx, selected_exemplars, vectors in self._select_exemplars(
+            data_manager, m
+        ):
+            self._memory.add(class_idx, selected_exemplars, vectors)
+            self._prototypes.add(class_idx, _normalize(vectors))
+        self._class_means = self._prototypes.means(self._total_classes, self.feature_dim)
+
+    def _select_exemplars(self, data_manager, m):
+        """
+        Select exemplars for all new classes (herding unless
+        `exemplar_selection` says otherwise) from a single feature pass over
+        their data. Yields (class_idx, exemplars, raw exemplar features); the
+        features are those of the pass, as the test transform is
+        deterministic.
+        """
+        classes = np.arange(self._known_classes, self._total_classes)
+        data, targets, idx_dataset = data_manager.get_dataset(
+            classes, source="train", mode="test", ret_data=True
+        )
+        idx_loader = data_manager.get_loader(
+            idx_dataset, batch_size=batch_size, shuffle=False, num_workers=4
+        )
+        columns = self._extract_branch_vectors(idx_loader, self._feature_branches())
+        self._branch_dims = [column.shape[1] for column in columns]
+        vectors = np.concatenate(columns, axis=1)
+        normalized = _normalize(vectors)
+
+        class_rows = [np.where(targets == class_idx)[0] for class_idx in classes]
+        selected = select(
+            self._selection,
+            [normalized[rows] for rows in class_rows],
+            m,
+            self.args.get("selection_device", self._device),
+            workers=self.args.get("selection_workers", 1),
+        )
+        for class_idx, rows, picks in zip(classes, class_rows, selected):
+            rows = rows[picks]
+            yield class_idx, data[rows], vectors[rows]
 
     def _construct_exemplar_unified(self, data_manager, m):
         logging.info(
             "Constructing exemplars for new classes...({} per classes)".format(m)
         )
-        _class_means = np.zeros((self._total_classes, self.feature_dim))
-
-        # Calculate the means of old classes with newly trained network
-        for class_idx in range(self._known_classes):
-            mask = np.where(self._targets_memory == class_idx)[0]
-            class_data, class_targets = (
-                self._data_memory[mask],
-                self._targets_memory[mask],
-            )
-
-            class_dset = data_manager.get_dataset(
-                [], source="train", mode="test", appendent=(class_data, class_targets)
-            )
-            class_loader = DataLoader(
-                class_dset, batch_size=batch_size, shuffle=False, num_workers=4
-            )
-            vectors, _ = self._extract_vectors(class_loader)
-            vectors = (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
-            mean = np.mean(vectors, axis=0)
-            mean = mean / np.linalg.norm(mean)
-
-            _class_means[class_idx, :] = mean
+        # Means of old classes with the newly trained network
+        self._sync_prototypes(data_manager)
 
         # Construct exemplars for new classes and calculate the means
-        for class_idx in range(self._known_classes, self._total_classes):
-            data, targets, class_dset = data_manager.get_dataset(
-                np.arange(class_idx, class_idx + 1),
-                source="train",
-                mode="test",
-                ret_data=True,
-            )
-            class_loader = DataLoader(
-                class_dset, batch_size=batch_size, shuffle=False, num_workers=4
-            )
-
-            vectors, _ = self._extract_vectors(class_loader)
-            vectors = (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
-            class_mean = np.mean(vectors, axis=0)
-
-            # Select
-            selected_exemplars = []
-            exemplar_vectors = []
-            for k in range(1, m + 1):
-                S = np.sum(
-                    exemplar_vectors, axis=0
-                )  # [feature_dim] sum of selected exemplars vectors
-                mu_p = (vectors + S) / k  # [n, feature_dim] sum to all vectors
-                i = np.argmin(np.sqrt(np.sum((class_mean - mu_p) ** 2, axis=1)))
-
-                selected_exemplars.append(
-                    np.array(data[i])
-                )  # New object to avoid passing by inference
-                exemplar_vectors.append(
-                    np.array(vectors[i])
-                )  # New object to avoid passing by inference
-
-                vectors = np.delete(
-                    vectors, i, axis=0
-                )  # Remove it to avoid duplicative selection
-                data = np.delete(
-                    data, i, axis=0
-                )  # Remove it to avoid duplicative selection
-
-            selected_exemplars = np.array(selected_exemplars)
-            exemplar_targets = np.full(m, class_idx)
-            self._data_memory = (
-                np.concatenate((self._data_memory, selected_exemplars))
-                if len(self._data_memory) != 0
-                else selected_exemplars
-            )
-            self._targets_memory = (
-                np.concatenate((self._targets_memory, exemplar_targets))
-                if len(self._targets_memory) != 0
-                else exemplar_targets
-            )
-
-            # Exemplar mean
-            exemplar_dset = data_manager.get_dataset(
-                [],
-                source="train",
-                mode="test",
-                appendent=(selected_exemplars, exemplar_targets),
-            )
-            exemplar_loader = DataLoader(
-                exemplar_dset, batch_size=batch_size, shuffle=False, num_workers=4
-            )
-            vectors, _ = self._extract_vectors(exemplar_loader)
-            vectors = (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
-            mean = np.mean(vectors, axis=0)
-            mean = mean / np.linalg.norm(mean)
-
-            _class_means[class_idx, :] = mean
-
-        self._class_means = _class_means
+        for class_idx, selected_exemplars, vectors in self._select_exemplars(
+            data_manager, m
+        ):
+            self._memory.add(class_idx, selected_exemplars, vectors)
+            self._prototypes.add(class_idx, _normalize(vectors))
+
+        self._class_means = self._prototypes.means(self._total_classes, self.feature_dim)
+
+
+# Learner attributes that are rebuilt from the config or the data manager, or
+# that describe the live process (devices, threads, loaders), not the task.
+_TRANSIENT = (
+    "args",
+    "_device",
+    "_multiple_gpus",
+    "_memory",
+    "_branch_fingerprints",
+    "_branch_dims",
+    "_prototypes",
+    "_validation",
+    "_eval_predictions",
+    "data_manager",
+    "train_loader",
+    "test_loader",
+)
+
+
+def _normalize(vectors):
+    return (vectors.T / (np.linalg.norm(vectors.T, axis=0) + EPSILON)).T
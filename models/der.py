@@ -6,7 +6,6 @@ import torch
 from torch import nn
 from torch import optim
 from torch.nn import functional as F
-from torch.utils.data import DataLoader
 from models.base import BaseLearner
 from utils.inc_net import DERNet, IncrementalNet
 from utils.toolkit import count_parameters, target2onehot, tensor2numpy
@@ -63,13 +62,13 @@ class DER(BaseLearner):
             mode="train",
             appendent=self._get_memory(),
         )
-        self.train_loader = DataLoader(
+        self.train_loader = data_manager.get_loader(
             train_dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers
         )
         test_dataset = data_manager.get_dataset(
             np.arange(0, self._total_classes), source="test", mode="test"
         )
-        self.test_loader = DataLoader(
+        self.test_loader = data_manager.get_loader(
             test_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers
         )
 
@@ -140,17 +139,15 @@ class DER(BaseLearner):
             scheduler.step()
             train_acc = np.around(tensor2numpy(correct) * 100 / total, decimals=2)
 
-            if epoch % 5 == 4:
-                test_acc = self._compute_accuracy(self._network, test_loader)
-                info = "Task {}, Epoch {}/{} => Loss {:.3f}, Train_accy {:.2f}, Test_accy {:.2f}".format(
+            if self._validation.due(epoch):
+                info = "Task {}, Epoch {}/{} => Loss {:.3f}, Train_accy {:.2f}".format(
                     self._cur_task,
                     epoch + 1,
                     init_epoch,
                     losses / len(train_loader),
                     train_acc,
-                    test_acc,
                 )
-                logging.info(info)
+                self._validation.submit(self._network, test_loader, info)
 
     def _update_representation(self, train_loader, test_loader, optimizer, scheduler):
         for epoch in range(epochs):
@@ -186,9 +183,8 @@ class DER(BaseLearner):
 
             scheduler.step()
             train_acc = np.around(tensor2numpy(correct) * 100 / total, decimals=2)
-            if epoch % 5 == 4:
-                test_acc = self._compute_accuracy(self._network, test_loader)
-                info = "Task {}, Epoch {}/{} => Loss {:.3f}, Loss_clf {:.3f}, Loss_aux {:.3f}, Train_accy {:.2f}, Test_accy {:.2f}".format(
+            if self._validation.due(epoch):
+                info = "Task {}, Epoch {}/{} => Loss {:.3f}, Loss_clf {:.3f}, Loss_aux {:.3f}, Train_accy {:.2f}".format(
                     self._cur_task,
                     epoch + 1,
                     epochs,
@@ -196,30 +192,5 @@ class DER(BaseLearner):
                     losses_clf / len(train_loader),
                     losses_aux / len(train_loader),
                     train_acc,
-                    test_acc,
                 )
-                logging.info(info)
-
-    def confusion_matrix(self, task_num, file_id):
-        total_class = 100
-        model = self._network
-        loader = self.test_loader
-        model.eval()
-        matrix = np.zeros((total_class, total_class))
-        matrix_task = np.zeros((task_num, task_num))
-        for i, (k, inputs, targets) in enumerate(loader):
-            inputs = inputs.to(self._device)
-            with torch.no_grad():
-                outputs = self._network(inputs)["logits"]
-                probs = torch.softmax(outputs, dim=1)
-                predicted = torch.argmax(probs, 1)
-                predicted = predicted.to('cpu')
-            for p,t in zip(predicted, targets):
-                matrix[t, p] += 1
-                matrix_task[t*task_num//total_class, p*task_num//total_class] +=1
-
-        import pandas as pd
-        df = pd.DataFrame(matrix)
-        df.to_csv('./csv/cm_' + file_id +'.csv', index=False, header=False)
-        df_task = pd.DataFrame(matrix_task)
-        df_task.to_csv('./csv/cm_task_' + file_id + '.csv', index=False, header=False)
+                self._validation.submit(self._network, test_loader, info)
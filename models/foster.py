@@ -5,7 +5,6 @@ import torch
 from torch import nn
 from torch import optim
 from torch.nn import functional as F
-from torch.utils.data import DataLoader
 from models.base import BaseLearner
 from utils.inc_net import FOSTERNet
 from utils.toolkit import count_parameters, target2onehot, tensor2numpy
@@ -64,7 +63,7 @@ class FOSTER(BaseLearner):
             mode="train",
             appendent=self._get_memory(),
         )
-        self.train_loader = DataLoader(
+        self.train_loader = data_manager.get_loader(
             train_dataset,
             batch_size=self.args["batch_size"],
             shuffle=True,
@@ -74,7 +73,7 @@ class FOSTER(BaseLearner):
         test_dataset = data_manager.get_dataset(
             np.arange(0, self._total_classes), source="test", mode="test"
         )
-        self.test_loader = DataLoader(
+        self.test_loader = data_manager.get_loader(
             test_dataset,
             batch_size=self.args["batch_size"],
             shuffle=False,
@@ -186,17 +185,15 @@ class FOSTER(BaseLearner):
             scheduler.step()
             train_acc = np.around(tensor2numpy(correct) * 100 / total, decimals=2)
             
-            if epoch % 5 == 4:
-                test_acc = self._compute_accuracy(self._network, test_loader)
-                info = "Task {}, Epoch {}/{} => Loss {:.3f}, Train_accy {:.2f}, Test_accy {:.2f}".format(
+            if self._validation.due(epoch):
+                info = "Task {}, Epoch {}/{} => Loss {:.3f}, Train_accy {:.2f}".format(
                     self._cur_task,
                     epoch + 1,
                     self.args["init_epochs"],
                     losses / len(train_loader),
                     train_acc,
-                    test_acc,
                 )
-                logging.info(info)
+                self._validation.submit(self._network, test_loader, info)
 
     def _feature_boosting(self, train_loader, test_loader, optimizer, scheduler):
         for epoch in range(self.args["boosting_epochs"]):
@@ -245,9 +242,8 @@ class FOSTER(BaseLearner):
                 total += len(targets)
             scheduler.step()
             train_acc = np.around(tensor2numpy(correct) * 100 / total, decimals=2)
-            if epoch % 5 == 4:
-                test_acc = self._compute_accuracy(self._network, test_loader)
-                info = "Task {}, Epoch {}/{} => Loss {:.3f}, Loss_clf {:.3f}, Loss_fe {:.3f}, Loss_kd {:.3f}, Train_accy {:.2f}, Test_accy {:.2f}".format(
+            if self._validation.due(epoch):
+                info = "Task {}, Epoch {}/{} => Loss {:.3f}, Loss_clf {:.3f}, Loss_fe {:.3f}, Loss_kd {:.3f}, Train_accy {:.2f}".format(
                     self._cur_task,
                     epoch + 1,
                     self.args["boosting_epochs"],
@@ -256,9 +252,8 @@ class FOSTER(BaseLearner):
                     losses_fe / len(train_loader),
                     losses_kd / len(train_loader),
                     train_acc,
-                    test_acc,
                 )
-                logging.info(info)
+                self._validation.submit(self._network, test_loader, info)
 
     def _feature_compression(self, train_loader, test_loader):
         self._snet = FOSTERNet(self.args, False)
@@ -310,17 +305,15 @@ class FOSTER(BaseLearner):
                 total += len(targets)
             scheduler.step()
             train_acc = np.around(tensor2numpy(correct) * 100 / total, decimals=2)
-            if epoch % 5 == 4:
-                test_acc = self._compute_accuracy(self._snet, test_loader)
-                info = "SNet: Task {}, Epoch {}/{} => Loss {:.3f},  Train_accy {:.2f}, Test_accy {:.2f}".format(
+            if self._validation.due(epoch):
+                info = "SNet: Task {}, Epoch {}/{} => Loss {:.3f},  Train_accy {:.2f}".format(
                     self._cur_task,
                     epoch + 1,
                     self.args["compression_epochs"],
                     losses / len(train_loader),
                     train_acc,
-                    test_acc,
                 )
-                logging.info(info)
+                self._validation.submit(self._snet, test_loader, info)
 
         if len(self._multiple_gpus) > 1:
             self._snet = self._snet.module
@@ -372,29 +365,6 @@ class FOSTER(BaseLearner):
         soft = soft / soft.sum(1)[:, None]
         return -1 * torch.mul(soft, pred).sum() / pred.shape[0]
     
-    def confusion_matrix(self, task_num, file_id):
-        total_class = 100
-        model = self._network
-        loader = self.test_loader
-        model.eval()
-        matrix = np.zeros((total_class, total_class))
-        matrix_task = np.zeros((task_num, task_num))
-        for i, (k, inputs, targets) in enumerate(loader):
-            inputs = inputs.to(self._device)
-            with torch.no_grad():
-                outputs = self._network(inputs)["logits"]
-                probs = torch.softmax(outputs, dim=1)
-                predicted = torch.argmax(probs, 1)
-                predicted = predicted.to('cpu')
-            for p,t in zip(predicted, targets):
-                matrix[t, p] += 1
-                matrix_task[t*task_num//total_class, p*task_num//total_class] +=1
-
-        import pandas as pd
-        df = pd.DataFrame(matrix)
-        df.to_csv('./csv/cm_' + file_id +'.csv', index=False, header=False)
-        df_task = pd.DataFrame(matrix_task)
-        df_task.to_csv('./csv/cm_task_' + file_id + '.csv', index=False, header=False)
 
 
 def _KD_loss(pred, soft, T):
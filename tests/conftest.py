@@ -0,0 +1,20 @@
+import numpy as np
+import pytest
+import utils.data_manager
+from utils.data import iCIFAR10
+
+
+class FakeCIFAR10(iCIFAR10):
+    """CIFAR-10 shaped random images, so tests need no download."""
+
+    def download_data(self):
+        rng = np.random.RandomState(0)
+        self.train_data = rng.randint(0, 256, (200, 32, 32, 3), dtype=np.uint8)
+        self.train_targets = rng.permutation(np.arange(200) % 10)
+        self.test_data = rng.randint(0, 256, (50, 32, 32, 3), dtype=np.uint8)
+        self.test_targets = rng.permutation(np.arange(50) % 10)
+
+
+@pytest.fixture
+def fake_cifar10(monkeypatch):
+    monkeypatch.setattr(utils.data_manager, "_get_idata", lambda name: FakeCIFAR10())
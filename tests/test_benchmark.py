@@ -0,0 +1,72 @@
+import json
+import pytest
+import torch
+import trainer
+from benchmark import bench_loader, build_data_manager
+from utils.data_manager import DataManager
+
+
+def _bench_args(config):
+    return {
+        "config": str(config),
+        "modes": ["train", "test"],
+        "workers": [0],
+        "prefetch": [2],
+        "pin": [0, 1],
+        "batch_size": 8,
+        "batches": 2,
+        "dry_run": False,
+    }
+
+
+def test_bench_loader_writes_the_best_settings_per_mode(fake_cifar10, tmp_path):
+    config = tmp_path / "exp.json"
+    tuned = {"flip": {"num_workers": 3}}
+    config.write_text(json.dumps({"dataset": "cifar10", "loader": tuned}))
+    bench_loader(_bench_args(config), DataManager("cifar10", False, 0, 2, 2))
+
+    param = json.loads(config.read_text())
+    assert param["dataset"] == "cifar10"
+    assert param["loader"]["flip"] == {"num_workers": 3}
+    for mode in ("train", "test"):
+        assert param["loader"][mode]["num_workers"] == 0
+
+
+@pytest.mark.skipif(torch.cuda.is_available(), reason="pinning is measured on a GPU")
+def test_bench_loader_leaves_pin_memory_unset_without_a_gpu(fake_cifar10, tmp_path):
+    config = tmp_path / "exp.json"
+    config.write_text(json.dumps({"dataset": "cifar10"}))
+    bench_loader(_bench_args(config), DataManager("cifar10", False, 0, 2, 2))
+
+    param = json.loads(config.read_text())
+    for mode in ("train", "test"):
+        assert "pin_memory" not in param["loader"][mode]
+
+
+def test_get_loader_applies_the_tuned_settings_of_the_dataset_mode(fake_cifar10):
+    data_manager = DataManager(
+        "cifar10", False, 0, 2, 2, loader_settings={"test": {"num_workers": 0}}
+    )
+    test_set = data_manager.get_dataset([0], source="test", mode="test")
+    train_set = data_manager.get_dataset([0], source="train", mode="train")
+    assert data_manager.get_loader(test_set, batch_size=8, num_workers=1).num_workers == 0
+    assert data_manager.get_loader(train_set, batch_size=8, num_workers=1).num_workers == 1
+
+
+def test_benchmark_builds_the_data_manager_of_training(fake_cifar10, tmp_path):
+    args = {
+        "dataset": "cifar10",
+        "shuffle": True,
+        "seed": [1993, 1994],
+        "init_cls": 4,
+        "increment": 2,
+        "device": ["cpu"],
+        "loader": {"test": {"num_workers": 0}},
+        "shared_data": True,
+        "shared_data_root": str(tmp_path),
+    }
+    benchmarked = build_data_manager(args)
+    trained = trainer.build_data_manager(dict(args, seed=1993))
+    assert benchmarked._class_order == trained._class_order
+    assert benchmarked._loader_settings == trained._loader_settings
+    assert benchmarked._shared_data and benchmarked._prefetch_device is None
@@ -0,0 +1,76 @@
+import numpy as np
+from utils.data_manager import DataManager
+
+
+def _data_manager(shuffle=True):
+    return DataManager("cifar10", shuffle, 1993, 4, 2)
+
+
+def _rows(targets, indices):
+    # What the concatenating get_dataset returned: the rows of each class in turn.
+    return np.concatenate([np.where(targets == idx)[0] for idx in indices])
+
+
+def test_get_dataset_is_a_view_of_the_requested_classes(fake_cifar10):
+    data_manager = _data_manager()
+    x, y = data_manager._train_data, data_manager._train_targets
+    data, targets, dataset = data_manager.get_dataset(
+        np.arange(2, 5), source="train", mode="test", ret_data=True
+    )
+    rows = _rows(y, range(2, 5))
+    assert dataset.images is x
+    assert np.array_equal(targets, y[rows])
+    assert np.array_equal(data, x[rows])
+    _, image, label = dataset[len(rows) - 1]
+    assert label == y[rows[-1]] and tuple(image.shape) == (3, 32, 32)
+
+
+def test_get_dataset_serves_the_appendent_after_the_classes(fake_cifar10):
+    data_manager = _data_manager()
+    memory = (data_manager._train_data[:3], np.array([0, 0, 1]))
+    dataset = data_manager.get_dataset(
+        np.arange(4, 6), source="test", mode="test", appendent=memory
+    )
+    nb_new = np.isin(data_manager._test_targets, [4, 5]).sum()
+    assert len(dataset) == nb_new + 3
+    assert [dataset[nb_new + i][2] for i in range(3)] == [0, 0, 1]
+    data, targets = dataset.get_data()
+    assert np.array_equal(data[nb_new:], memory[0])
+    assert np.array_equal(targets[nb_new:], memory[1])
+
+
+def test_get_dataset_with_no_classes(fake_cifar10):
+    memory = (np.zeros((2, 32, 32, 3), dtype=np.uint8), np.array([1, 3]))
+    dataset = _data_manager().get_dataset(
+        [], source="train", mode="train", appendent=memory
+    )
+    assert len(dataset) == 2 and dataset[1][2] == 3
+
+
+def test_split_picks_the_same_number_of_validation_rows_per_class(fake_cifar10):
+    data_manager = _data_manager()
+    memory = (data_manager._train_data[:12], np.repeat([0, 1, 2], 4))
+    train, val = data_manager.get_dataset_with_split(
+        np.arange(4, 6), "train", "train", appendent=memory, val_samples_per_class=3
+    )
+    train_x, train_y = train.get_data()
+    val_x, val_y = val.get_data()
+    assert np.array_equal(np.bincount(val_y), [3, 3, 3, 0, 3, 3])
+    assert np.array_equal(np.bincount(train_y), [1, 1, 1, 0, 17, 17])
+    # Every row lands on exactly one side of the split.
+    rows = np.concatenate([train.indices, val.indices])
+    expected = _rows(data_manager._train_targets, [4, 5])
+    assert np.array_equal(np.sort(rows), np.sort(expected))
+    assert len(val_x) == len(val_y) and len(train_x) == len(train_y)
+
+
+def test_finetune_dataset_balances_new_classes_against_the_memory(fake_cifar10):
+    data_manager = _data_manager()
+    memory = (data_manager._train_data[:16], np.tile([3, 2, 1, 0], 4))
+    dataset = data_manager.get_finetune_dataset(
+        4, 6, "train", "train", memory, type="ratio"
+    )
+    _, targets = dataset.get_data()
+    # 16 old exemplars over 4 classes: 2 new classes get 8 samples, 4 each.
+    assert np.array_equal(np.bincount(targets), [4, 4, 4, 4, 4, 4])
+    assert np.array_equal(targets[-16:], np.repeat([0, 1, 2, 3], 4))
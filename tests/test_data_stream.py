@@ -0,0 +1,28 @@
+import numpy as np
+from utils.data_manager import DataManager
+from utils.data_stream import export_shards
+from conftest import FakeCIFAR10
+
+
+def _data_manager(stream_dir):
+    return DataManager("cifar10", False, 1993, 4, 2, stream_dir=str(stream_dir))
+
+
+def _epoch_labels(loader):
+    return np.concatenate([targets.numpy() for _, _, targets in loader])
+
+
+def test_shuffle_order_changes_every_epoch_without_workers(fake_cifar10, tmp_path):
+    export_shards(FakeCIFAR10(), str(tmp_path), shard_size=8)
+    data_manager = _data_manager(tmp_path)
+    dataset = data_manager.get_dataset(np.arange(4), source="train", mode="train")
+    loader = data_manager.get_loader(dataset, 16, shuffle=True, num_workers=0)
+    first, second = _epoch_labels(loader), _epoch_labels(loader)
+    assert sorted(first) == sorted(second) and len(first) == 80
+    assert not np.array_equal(first, second)
+
+    # The same seed replays the same epochs.
+    data_manager = _data_manager(tmp_path)
+    dataset = data_manager.get_dataset(np.arange(4), source="train", mode="train")
+    loader = data_manager.get_loader(dataset, 16, shuffle=True, num_workers=0)
+    assert np.array_equal(_epoch_labels(loader), first)
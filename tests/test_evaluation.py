@@ -0,0 +1,154 @@
+import numpy as np
+import pytest
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+from models.base import BaseLearner
+from utils.prefetch import DevicePrefetcher
+
+
+class _Net(nn.Module):
+    def __init__(self, nb_classes=6, dim=8):
+        super().__init__()
+        torch.manual_seed(0)
+        self.convnet = nn.Linear(12, dim)
+        self.fc = nn.Linear(dim, nb_classes)
+
+    @property
+    def feature_dim(self):
+        return self.fc.in_features
+
+    def extract_vector(self, x):
+        return self.convnet(x)
+
+    def forward(self, x):
+        features = self.convnet(x)
+        return {"logits": self.fc(features), "features": features}
+
+
+class _DeviceTargets(object):
+    """Stands in for targets a DevicePrefetcher left on a CUDA device."""
+
+    def __init__(self, targets):
+        self._targets = targets
+
+    def numpy(self):
+        raise TypeError("can't convert cuda:0 device type tensor to numpy.")
+
+    def cpu(self):
+        return self._targets
+
+
+def _learner(device="cpu"):
+    learner = BaseLearner(
+        {"memory_size": 20, "device": [device], "init_cls": 2, "increment": 2}
+    )
+    learner._network = _Net().to(device)
+    learner._known_classes, learner._total_classes = 2, 6
+    rng = np.random.RandomState(0)
+    means = rng.randn(6, 8)
+    learner._class_means = means / np.linalg.norm(means, axis=1, keepdims=True)
+    return learner
+
+
+def _batches(n=40, batch_size=16):
+    inputs = torch.randn(n, 12, generator=torch.Generator().manual_seed(1))
+    targets = torch.arange(n) % 4
+    return [
+        (None, inputs[start : start + batch_size], targets[start : start + batch_size])
+        for start in range(0, n, batch_size)
+    ]
+
+
+def _accuracy(predicts, targets):
+    return np.around((predicts == targets[:, None]).any(axis=1).mean() * 100, decimals=2)
+
+
+def test_streamed_nme_matches_scoring_all_features_at_once():
+    learner = _learner()
+    learner.test_loader = _batches()
+    _, nme_accy = learner.eval_task()
+
+    inputs = torch.cat([x for _, x, _ in learner.test_loader])
+    targets = torch.cat([y for _, _, y in learner.test_loader]).numpy()
+    with torch.no_grad():
+        features = nn.functional.normalize(learner._network(inputs)["features"], dim=1)
+    dists = ((features.numpy()[:, None] - learner._class_means[None]) ** 2).sum(axis=2)
+    predicts = np.argsort(dists, axis=1)
+    assert nme_accy["top1"] == _accuracy(predicts[:, :1], targets)
+    assert nme_accy["top{}".format(learner.topk)] == _accuracy(
+        predicts[:, : learner.topk], targets
+    )
+
+
+def test_eval_task_accepts_targets_on_the_prefetch_device():
+    learner = _learner()
+    batches = _batches()
+    learner.test_loader = batches
+    expected = learner.eval_task()
+
+    learner.test_loader = [(i, x, _DeviceTargets(y)) for i, x, y in batches]
+    cnn_accy, nme_accy = learner.eval_task()
+    assert cnn_accy == expected[0] and nme_accy == expected[1]
+    assert np.array_equal(learner._eval_predictions[1], np.arange(40) % 4)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs a CUDA device")
+def test_eval_task_with_device_prefetcher():
+    learner = _learner("cuda:0")
+    inputs = torch.cat([x for _, x, _ in _batches()])
+    dataset = TensorDataset(torch.arange(40), inputs, torch.arange(40) % 4)
+    learner.test_loader = DevicePrefetcher(DataLoader(dataset, batch_size=16), "cuda:0")
+    cnn_accy, nme_accy = learner.eval_task()
+    assert nme_accy is not None and 0 <= cnn_accy["top1"] <= 100
+
+
+def test_compute_accuracy_counts_on_the_device():
+    learner = _learner()
+    batches = _batches()
+    inputs = torch.cat([x for _, x, _ in batches])
+    with torch.no_grad():
+        predicts = learner._network(inputs)["logits"].argmax(dim=1)
+    targets = torch.cat([y for _, _, y in batches])
+    expected = np.around((predicts == targets).float().mean().item() * 100, decimals=2)
+    assert learner._compute_accuracy(learner._network, batches) == expected
+
+
+def test_combined_pass_matches_separate_heads():
+    learner = _learner()
+    learner.test_loader = _batches()
+    cnn_pred, nme_pred, y_true = learner._eval_combined(learner.test_loader)
+    inputs = torch.cat([x for _, x, _ in learner.test_loader])
+    with torch.no_grad():
+        outputs = learner._network(inputs)
+    logits_top = outputs["logits"].topk(learner.topk, dim=1)[1].numpy()
+    features = nn.functional.normalize(outputs["features"], dim=1).numpy()
+    dists = ((features[:, None] - learner._class_means[None]) ** 2).sum(axis=2)
+    assert np.array_equal(cnn_pred, logits_top)
+    assert np.array_equal(nme_pred, np.argsort(dists, axis=1)[:, : learner.topk])
+
+
+def test_eval_task_keeps_the_top1_cnn_predictions():
+    learner = _learner()
+    learner.test_loader = _batches()
+    cnn_accy, _ = learner.eval_task()
+    predicts, targets = learner._eval_predictions
+    assert np.array_equal(targets, np.arange(40) % 4)
+    assert cnn_accy["top1"] == np.around((predicts == targets).mean() * 100, decimals=2)
+
+
+def test_confusion_matrix_uses_the_cached_predictions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    learner = _learner()
+    learner.test_loader = _batches()
+    learner.eval_task()
+    learner.test_loader = None  # no second pass
+    learner.confusion_matrix(3, "run")
+
+    predicts, targets = learner._eval_predictions
+    matrix = np.load("csv/cm_run.npy")
+    matrix_task = np.loadtxt("csv/cm_task_run.csv", delimiter=",")
+    assert matrix.shape == (6, 6) and matrix.sum() == 40
+    correct = np.bincount(targets[predicts == targets], minlength=6)
+    assert np.array_equal(np.diag(matrix), correct)
+    assert np.array_equal(matrix_task.sum(axis=1), [20, 20, 0])
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from utils.exemplar_codec import EncodedImages, encoded_bytes, get_codec
+from utils.exemplar_memory import ExemplarMemory
+
+
+def _images(n=6, size=32):
+    # Smooth images, as lossy codecs are meant for natural images.
+    x = np.linspace(0, 255, size)
+    image = (x[:, None, None] + x[None, :, None] + np.zeros(3)) / 2
+    return np.stack([np.roll(image, i, axis=0) for i in range(n)]).astype(np.uint8)
+
+
+@pytest.mark.parametrize(
+    "name, kwargs, tolerance",
+    [("raw", {}, 0), ("jpeg", {"quality": 90}, 8), ("downsample", {"factor": 2}, 8)],
+)
+def test_codecs_round_trip(name, kwargs, tolerance):
+    codec = get_codec(name, **kwargs)
+    images = _images()
+    encoded = codec.encode(images)
+    decoded = np.asarray(EncodedImages(encoded, codec))
+    assert decoded.shape == images.shape
+    assert np.abs(decoded.astype(int) - images).mean() <= tolerance
+    if name != "raw":
+        assert encoded_bytes(encoded) < images[0].nbytes
+
+
+def test_encoded_images_decode_on_indexing():
+    codec = get_codec("jpeg")
+    view = EncodedImages(codec.encode(_images()), codec)
+    assert view[2].shape == (32, 32, 3)
+    assert len(view[1:4]) == 3 and isinstance(view[1:4], EncodedImages)
+
+
+def test_unknown_codec():
+    with pytest.raises(NotImplementedError):
+        get_codec("png")
+
+
+def test_memory_keeps_its_codec_and_int8_vectors_across_save(tmp_path):
+    memory = ExemplarMemory(10, get_codec("jpeg", quality=80), vector_dtype="int8")
+    vectors = np.random.RandomState(0).randn(6, 16).astype(np.float32)
+    memory.add(0, _images(), vectors)
+    memory.save(str(tmp_path / "task_0"))
+
+    loaded = ExemplarMemory.load(str(tmp_path / "task_0"))
+    assert loaded.codec.config() == {"name": "jpeg", "quality": 80}
+    assert loaded.vector_dtype == "int8"
+    assert np.array_equal(np.asarray(loaded.data), np.asarray(memory.data))
+    assert np.abs(loaded.vectors - vectors).max() <= np.abs(vectors).max() / 127
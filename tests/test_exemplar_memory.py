@@ -0,0 +1,85 @@
+import os
+import numpy as np
+from utils.exemplar_memory import ExemplarMemory
+
+
+def _images(class_idx, n):
+    images = np.zeros((n, 4, 4, 3), dtype=np.uint8)
+    images[:, 0, 0, 0] = class_idx
+    images[:, 0, 0, 1] = np.arange(n)
+    return images
+
+
+def _vectors(class_idx, n, dim=8):
+    return np.full((n, dim), class_idx + np.arange(n)[:, None] / 100, dtype=np.float32)
+
+
+def _filled(classes, n=5, capacity=20):
+    memory = ExemplarMemory(capacity)
+    for class_idx in classes:
+        memory.add(class_idx, _images(class_idx, n), _vectors(class_idx, n))
+    return memory
+
+
+def test_slots_keep_the_data_targets_and_vectors_of_each_class():
+    memory = _filled([3, 0, 1])
+    assert len(memory) == 15 and memory.classes == [3, 0, 1]
+    assert np.array_equal(memory.targets, np.repeat([3, 0, 1], 5))
+    assert np.array_equal(memory.data[memory.rows(0)], _images(0, 5))
+    assert np.allclose(memory.vectors[memory.rows(1)], _vectors(1, 5))
+    data, targets = memory.get()
+    assert len(data) == len(targets) == 15
+
+
+def test_reduce_keeps_the_first_exemplars_of_each_class_in_place():
+    memory = _filled([0, 1, 2])
+    buffer = memory.data
+    memory.reduce(2)
+    assert len(memory) == 6
+    assert np.shares_memory(memory.data, buffer)
+    for class_idx in range(3):
+        assert np.array_equal(memory.data[memory.rows(class_idx)], _images(class_idx, 2))
+        assert np.allclose(memory.vectors[memory.rows(class_idx)], _vectors(class_idx, 2))
+
+
+def test_memory_grows_past_its_capacity():
+    memory = _filled(range(5), n=5, capacity=8)
+    assert len(memory) == 25 and memory.capacity >= 25
+    assert np.array_equal(memory.data[memory.rows(4)], _images(4, 5))
+
+
+def test_vectors_are_dropped_when_an_exemplar_has_none():
+    memory = _filled([0])
+    memory.add(1, _images(1, 5))
+    assert memory.vectors is None
+    memory.set_vectors(0, _vectors(0, 5))
+    memory.set_vectors(1, _vectors(1, 5))
+    assert np.allclose(memory.vectors[memory.rows(1)], _vectors(1, 5))
+
+
+def test_saved_memory_loads_as_a_copy_on_write_map(tmp_path):
+    memory = _filled([2, 0, 1])
+    memory.reduce(3)
+    directory = str(tmp_path / "task_0")
+    memory.save(directory)
+    memory.save(directory)  # replaces the previous snapshot
+
+    loaded = ExemplarMemory.load(directory)
+    assert loaded.classes == [2, 0, 1] and len(loaded) == 9
+    assert isinstance(loaded.data, np.memmap)
+    for class_idx in range(3):
+        assert np.array_equal(loaded.data[loaded.rows(class_idx)], _images(class_idx, 3))
+        assert np.allclose(loaded.vectors[loaded.rows(class_idx)], _vectors(class_idx, 3))
+
+    loaded.reduce(1)
+    loaded.add(5, _images(5, 4), _vectors(5, 4))
+    assert np.array_equal(loaded.targets, [2, 0, 1, 5, 5, 5, 5])
+    assert np.array_equal(ExemplarMemory.load(directory).targets, memory.targets)
+    assert sorted(os.listdir(str(tmp_path))) == ["task_0"]
+
+
+def test_segments_follow_the_slot_layout():
+    memory = _filled([2, 0, 1], n=5)
+    memory.reduce(3)
+    memory.add(4, _images(4, 2))
+    assert memory.segments() == ([2, 0, 1, 4], [3, 3, 3, 2])
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+import utils.exemplar_selection
+from utils.exemplar_selection import SELECTION_STRATEGIES, herding, herding_batch, select
+
+
+def _features(n, d=16, seed=0):
+    vectors = np.random.RandomState(seed).randn(n, d).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _reference_herding(vectors, m):
+    # The original loop: re-sum the chosen features and delete chosen rows.
+    class_mean = np.mean(vectors, axis=0)
+    rows = np.arange(len(vectors))
+    chosen, chosen_vectors = [], []
+    for k in range(1, min(m, len(vectors)) + 1):
+        S = np.sum(chosen_vectors, axis=0)
+        mu_p = (vectors + S) / k
+        i = np.argmin(np.sqrt(np.sum((class_mean - mu_p) ** 2, axis=1)))
+        chosen.append(rows[i])
+        chosen_vectors.append(vectors[i])
+        vectors, rows = np.delete(vectors, i, axis=0), np.delete(rows, i)
+    return np.array(chosen)
+
+
+def test_herding_picks_the_same_exemplars_as_the_reference_loop():
+    vectors = _features(60)
+    assert np.array_equal(herding(vectors, 20), _reference_herding(vectors, 20))
+
+
+def test_small_classes_yield_all_their_samples():
+    picks = herding(_features(5), 20)
+    assert sorted(picks) == list(range(5))
+
+
+def test_batched_herding_matches_herding_per_class():
+    classes = [_features(n, seed=n) for n in (30, 12, 45)]
+    for picks, vectors in zip(herding_batch(classes, 20), classes):
+        assert np.array_equal(picks, _reference_herding(vectors, 20))
+
+
+def test_grouping_classes_does_not_change_the_picks():
+    classes = [_features(n, seed=n) for n in (30, 12, 45, 7)]
+    # Room for one padded class per group.
+    grouped = herding_batch(classes, 10, max_elements=45 * 16)
+    for picks, expected in zip(grouped, herding_batch(classes, 10)):
+        assert np.array_equal(picks, expected)
+
+
+@pytest.mark.parametrize("strategy", sorted(SELECTION_STRATEGIES))
+def test_strategies_pick_distinct_rows_of_each_class(strategy):
+    classes = [_features(n, seed=n) for n in (30, 12, 4)]
+    for picks, vectors in zip(select(strategy, classes, 10), classes):
+        assert len(picks) == min(10, len(vectors))
+        assert len(set(picks.tolist())) == len(picks)
+        assert picks.min() >= 0 and picks.max() < len(vectors)
+
+
+def test_select_herding_is_herding_batch():
+    classes = [_features(n, seed=n) for n in (30, 12)]
+    for picks, expected in zip(select("herding", classes, 10), herding_batch(classes, 10)):
+        assert np.array_equal(picks, expected)
+
+
+def test_mean_distance_picks_the_samples_nearest_the_mean():
+    vectors = _features(30)
+    dists = ((vectors - vectors.mean(axis=0)) ** 2).sum(axis=1)
+    assert np.array_equal(select("mean_distance", [vectors], 5)[0], np.argsort(dists)[:5])
+
+
+def test_unknown_strategy():
+    with pytest.raises(NotImplementedError):
+        select("gradient_matching", [_features(10)], 5)
+
+
+@pytest.mark.parametrize("strategy", ["herding", "kcenter", "mean_distance"])
+def test_thread_pool_matches_a_single_worker(strategy):
+    classes = [_features(n, seed=n) for n in (30, 12, 45, 7, 20)]
+    single = select(strategy, classes, 8, workers=1)
+    pooled = select(strategy, classes, 8, workers=3)
+    for picks, expected in zip(pooled, single):
+        assert np.array_equal(picks, expected)
+
+
+def test_selection_runs_on_one_worker_by_default(monkeypatch):
+    def pooled(*args):
+        raise AssertionError("the thread pool is opt-in")
+
+    monkeypatch.setattr(utils.exemplar_selection, "_parallel", pooled)
+    classes = [_features(n, seed=n) for n in (30, 12, 45)]
+    for picks, expected in zip(select("herding", classes, 8), herding_batch(classes, 8)):
+        assert np.array_equal(picks, expected)
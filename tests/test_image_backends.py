@@ -0,0 +1,45 @@
+import sys
+import types
+import numpy as np
+from PIL import Image
+from torchvision import transforms
+from utils.data_manager import get_image_loader
+from utils.image_cache import DecodedImageCache
+
+
+class _AccImage(object):
+    """Minimal accimage.Image: decodes through PIL, exposes copyto only."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            pixels = np.asarray(Image.open(f).convert("RGB"))
+        self._pixels = pixels.transpose(2, 0, 1)
+        self.channels, self.height, self.width = self._pixels.shape
+
+    def copyto(self, array):
+        array[...] = self._pixels
+
+
+def _image(tmp_path):
+    pixels = np.random.RandomState(0).randint(0, 256, (12, 16, 3), dtype=np.uint8)
+    path = str(tmp_path / "image.png")
+    Image.fromarray(pixels).save(path)
+    return path, pixels
+
+
+def test_accimage_backend_yields_pil_images(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "accimage", types.SimpleNamespace(Image=_AccImage))
+    path, pixels = _image(tmp_path)
+    image = get_image_loader("accimage")(path)
+    assert isinstance(image, Image.Image)
+    assert np.array_equal(np.asarray(image), pixels)
+    transforms.ColorJitter(brightness=0.4)(image)
+
+
+def test_accimage_backend_works_with_the_decoded_cache(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "accimage", types.SimpleNamespace(Image=_AccImage))
+    path, pixels = _image(tmp_path)
+    cache = DecodedImageCache(get_image_loader("accimage"), 2**20, root=str(tmp_path))
+    for _ in range(2):  # a miss, then a hit
+        assert np.array_equal(np.asarray(cache(path)), pixels)
+    assert cache.nbytes > 0
@@ -0,0 +1,48 @@
+import numpy as np
+from PIL import Image
+from utils.image_cache import DecodedImageCache
+
+
+class _CountingLoader(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        with open(path, "rb") as f:
+            return Image.open(f).convert("RGB")
+
+
+def _images(tmp_path, n, size=16):
+    rng = np.random.RandomState(0)
+    paths = []
+    for i in range(n):
+        path = str(tmp_path / "{}.png".format(i))
+        pixels = rng.randint(0, 256, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_hits_are_served_without_decoding(tmp_path):
+    path = _images(tmp_path, 1)[0]
+    loader = _CountingLoader()
+    cache = DecodedImageCache(loader, 2**20, root=str(tmp_path))
+    first, second = cache(path), cache(path)
+    assert loader.calls == 1
+    assert np.array_equal(np.asarray(first), np.asarray(second))
+    assert cache.nbytes > 16 * 16 * 3
+
+
+def test_eviction_keeps_the_cache_under_budget(tmp_path):
+    paths = _images(tmp_path, 8)
+    loader = _CountingLoader()
+    # Room for about three decoded 16x16 images.
+    cache = DecodedImageCache(loader, 3 * (16 * 16 * 3 + 128), root=str(tmp_path))
+    for path in paths:
+        cache(path)
+    assert 0 < cache.nbytes <= cache.max_bytes
+    cache.clear()
+    assert cache.nbytes == 0
+    cache(paths[0])
+    assert loader.calls == len(paths) + 1
@@ -0,0 +1,52 @@
+import numpy as np
+from torch import nn
+from models.base import BaseLearner
+
+
+class _Net(nn.Module):
+    feature_dim = 512
+
+
+class _DataManager(object):
+    def get_dataset(self, indices, source, mode, ret_data=False):
+        images = np.random.RandomState(0).randint(0, 256, (32, 32, 32, 3), dtype=np.uint8)
+        return images, np.zeros(len(images), dtype=np.int64), None
+
+
+def _per_class(vector_dtype, codec="raw"):
+    learner = BaseLearner(
+        {
+            "memory_size": 2000,
+            "memory_bytes": 8 * 2**20,
+            "memory_codec": codec,
+            "memory_vectors": vector_dtype,
+            "device": ["cpu"],
+        }
+    )
+    learner._network = _Net()
+    learner._known_classes, learner._total_classes = 0, 10
+    return learner._budget_per_class(_DataManager()), learner._exemplar_bytes
+
+
+def test_raw_exemplars_cost_their_image_and_feature_bytes():
+    per_class, exemplar_bytes = _per_class("float32")
+    assert exemplar_bytes == 32 * 32 * 3 + 4 * 512
+    assert per_class == 8 * 2**20 // (exemplar_bytes * 10)
+
+
+def test_smaller_codecs_fit_more_exemplars_in_the_same_budget():
+    raw_per_class, _ = _per_class("float32")
+    downsampled_per_class, _ = _per_class("float32", codec="downsample")
+    assert downsampled_per_class > raw_per_class
+
+
+def test_int8_vectors_cost_one_byte_per_element_plus_a_scale():
+    _, float_bytes = _per_class("float32")
+    _, int8_bytes = _per_class("int8")
+    assert float_bytes - int8_bytes == 3 * 512 - 4
+
+
+def test_int8_vectors_fit_more_exemplars_in_the_same_budget():
+    float_per_class, _ = _per_class("float32")
+    int8_per_class, _ = _per_class("int8")
+    assert int8_per_class > float_per_class
@@ -0,0 +1,34 @@
+import numpy as np
+import torch
+from scipy.spatial.distance import cdist
+from utils.nme import NMEClassifier
+
+
+def _means(nb_classes=10, dim=16):
+    means = np.random.RandomState(0).randn(nb_classes, dim)
+    means /= np.linalg.norm(means, axis=1, keepdims=True)
+    means[-1] = 0  # a class without exemplars
+    return means
+
+
+def test_predictions_match_cdist_on_normalized_features():
+    means = _means()
+    vectors = np.random.RandomState(1).randn(200, 16).astype(np.float32)
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    expected = np.argsort(cdist(normalized, means, "sqeuclidean"), axis=1)[:, :5]
+    predicts = NMEClassifier(means, chunk_size=64).predict(vectors, k=5)
+    assert np.array_equal(predicts.numpy(), expected)
+
+
+def test_chunking_does_not_change_predictions():
+    vectors = torch.randn(100, 16, generator=torch.Generator().manual_seed(2))
+    classifier = NMEClassifier(list(torch.as_tensor(_means())))
+    whole = classifier.predict(vectors, k=3)
+    classifier.chunk_size = 7
+    assert torch.equal(classifier.predict(vectors, k=3), whole)
+
+
+def test_k_is_capped_and_empty_input_is_allowed():
+    classifier = NMEClassifier(_means(nb_classes=3))
+    assert classifier.predict(torch.randn(4, 16), k=5).shape == (4, 3)
+    assert classifier.predict(torch.zeros(0, 16), k=2).shape == (0, 2)
@@ -0,0 +1,46 @@
+import pytest
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+from utils.data_manager import DataManager
+from utils.prefetch import DevicePrefetcher, PrefetchStats
+
+
+def _loader():
+    dataset = TensorDataset(torch.arange(40), torch.randn(40, 3), torch.arange(40) % 4)
+    return DataLoader(dataset, batch_size=16)
+
+
+def _assert_same_batches(prefetcher, loader):
+    batches = list(prefetcher)
+    expected = list(loader)
+    assert len(batches) == len(expected) == len(prefetcher)
+    for batch, reference in zip(batches, expected):
+        assert all(torch.equal(a.cpu(), b) for a, b in zip(batch, reference))
+
+
+def test_prefetcher_yields_the_loader_batches_and_counts_them():
+    loader, stats = _loader(), PrefetchStats()
+    prefetcher = DevicePrefetcher(loader, "cpu", stats)
+    _assert_same_batches(prefetcher, loader)
+    assert stats.batches == 3
+    assert 0 <= stats.stall_time <= stats.total_time
+    stats.reset()
+    assert stats.batches == 0
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs a CUDA device")
+def test_prefetcher_moves_batches_to_cuda():
+    loader = _loader()
+    prefetcher = DevicePrefetcher(loader, "cuda:0")
+    assert all(batch[1].is_cuda for batch in prefetcher)
+    _assert_same_batches(prefetcher, loader)
+
+
+def test_get_loader_wraps_loaders_for_the_prefetch_device(fake_cifar10):
+    data_manager = DataManager("cifar10", False, 0, 2, 2, prefetch_device="cpu")
+    dataset = data_manager.get_dataset([0, 1], source="test", mode="test")
+    loader = data_manager.get_loader(dataset, batch_size=4)
+    assert isinstance(loader, DevicePrefetcher)
+    assert not loader.loader.pin_memory
+    assert sum(len(targets) for _, _, targets in loader) == len(dataset)
+    assert data_manager.prefetch_stats.batches == len(loader)
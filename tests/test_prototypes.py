@@ -0,0 +1,45 @@
+import numpy as np
+from utils.prototypes import PrototypeStore
+
+
+def _unit(n, d=8, seed=0):
+    vectors = np.random.RandomState(seed).randn(n, d)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _mean(vectors):
+    mean = vectors.mean(axis=0)
+    return mean / np.linalg.norm(mean)
+
+
+def test_means_follow_added_and_removed_exemplars():
+    store = PrototypeStore()
+    a, b = _unit(10, seed=1), _unit(6, seed=2)
+    store.add(0, a)
+    store.add(2, b)
+    # Drop the last 3 rows of class 0 and the first row of class 2 in one go;
+    # the empty segment of class 1 is skipped.
+    dropped = np.zeros(16, dtype=bool)
+    dropped[7:11] = True
+    store.add_segments([0, 1, 2], np.concatenate([a, b]), [10, 0, 6], dropped, sign=-1)
+    means = store.means(4, 8)
+    assert np.allclose(means[0], _mean(a[:7]))
+    assert np.allclose(means[2], _mean(b[1:]))
+    assert not means[1].any() and not means[3].any()
+
+
+def test_segments_add_like_one_add_per_class():
+    vectors = _unit(12)
+    segmented, per_class = PrototypeStore(), PrototypeStore()
+    segmented.add_segments([3, 1, 0], vectors, [5, 4, 3])
+    for class_idx, rows in ((3, slice(0, 5)), (1, slice(5, 9)), (0, slice(9, 12))):
+        per_class.add(class_idx, vectors[rows])
+    assert np.allclose(segmented.means(4, 8), per_class.means(4, 8))
+
+
+def test_reset_stamps_a_new_version():
+    store = PrototypeStore()
+    store.add(0, _unit(3))
+    store.reset(("branch", 1))
+    assert store.version == ("branch", 1)
+    assert not store.means(1, 8).any()
@@ -0,0 +1,159 @@
+import numpy as np
+import torch
+from torch import nn
+from models.base import BaseLearner
+from utils.data_manager import DataManager
+from utils.exemplar_selection import herding
+
+
+class _Net(nn.Module):
+    def __init__(self, nb_classes=10, dim=16):
+        super().__init__()
+        torch.manual_seed(0)
+        self.convnet = nn.Sequential(nn.Flatten(), nn.Linear(3 * 32 * 32, dim))
+        self.fc = nn.Linear(dim, nb_classes)
+
+    @property
+    def feature_dim(self):
+        return self.fc.in_features
+
+    def extract_vector(self, x):
+        return self.convnet(x)
+
+    def forward(self, x):
+        features = self.convnet(x)
+        return {"logits": self.fc(features), "features": features}
+
+
+def _data_manager():
+    return DataManager(
+        "cifar10", False, 0, 4, 2, loader_settings={"test": {"num_workers": 0}}
+    )
+
+
+def _learner(known_classes, total_classes, memory_size=40):
+    learner = BaseLearner({"memory_size": memory_size, "device": ["cpu"]})
+    learner._network = _Net()
+    learner._known_classes, learner._total_classes = known_classes, total_classes
+    return learner
+
+
+def _features(learner, data_manager, class_idx):
+    data, _, dataset = data_manager.get_dataset(
+        [class_idx], source="train", mode="test", ret_data=True
+    )
+    inputs = torch.stack([dataset[i][1] for i in range(len(dataset))])
+    with torch.no_grad():
+        vectors = learner._network.extract_vector(inputs).numpy()
+    return data, vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_exemplars_of_all_new_classes_match_herding_per_class(fake_cifar10):
+    data_manager = _data_manager()
+    learner = _learner(0, 4)
+    learner.build_rehearsal_memory(data_manager, 5)
+
+    for class_idx in range(4):
+        data, vectors = _features(learner, data_manager, class_idx)
+        picks = herding(vectors, 5)
+        rows = np.where(learner._targets_memory == class_idx)[0]
+        assert np.array_equal(learner._data_memory[rows], data[picks])
+        mean = vectors[picks].mean(axis=0)
+        assert np.allclose(
+            learner._class_means[class_idx], mean / np.linalg.norm(mean), atol=1e-5
+        )
+
+
+def _count_extracted(learner):
+    counts, extract = [], learner._network.extract_vector
+    learner._network.extract_vector = lambda x: counts.append(len(x)) or extract(x)
+    return counts
+
+
+def _next_task(learner, data_manager, per_class, increment=2):
+    learner._known_classes = learner._total_classes
+    learner._total_classes += increment
+    learner.build_rehearsal_memory(data_manager, per_class)
+
+
+def test_stored_features_are_reused_while_the_network_is_unchanged(fake_cifar10):
+    data_manager = _data_manager()
+    learner = _learner(0, 4)
+    learner.build_rehearsal_memory(data_manager, 5)
+    counts = _count_extracted(learner)
+
+    _next_task(learner, data_manager, 4)
+    assert sum(counts) == 2 * 20  # only the new classes
+
+    counts.clear()
+    with torch.no_grad():
+        learner._network.convnet[1].weight.add_(0.01)
+    _next_task(learner, data_manager, 3)
+    # The whole memory, before it is reduced, then the new classes.
+    assert sum(counts) == 6 * 4 + 2 * 20
+    # Old-class means come from the re-extracted features of their exemplars.
+    for class_idx in range(6):
+        data, vectors = _features(learner, data_manager, class_idx)
+        exemplars = learner._data_memory[learner._targets_memory == class_idx]
+        picks = [
+            np.where((data == image).all(axis=(1, 2, 3)))[0][0] for image in exemplars
+        ]
+        mean = vectors[picks].mean(axis=0)
+        assert np.allclose(
+            learner._class_means[class_idx], mean / np.linalg.norm(mean), atol=1e-5
+        )
+
+
+class _Branch(nn.Module):
+    def __init__(self, seed, dim=8):
+        super().__init__()
+        torch.manual_seed(seed)
+        self.fc = nn.Linear(3 * 32 * 32, dim)
+        self.calls = 0
+
+    def forward(self, x):
+        self.calls += len(x)
+        return {"features": self.fc(x.flatten(1))}
+
+
+class _DERNet(nn.Module):
+    """One convnet per task, features concatenated, as in DER."""
+
+    def __init__(self):
+        super().__init__()
+        self.convnets = nn.ModuleList([_Branch(0)])
+
+    @property
+    def feature_dim(self):
+        return 8 * len(self.convnets)
+
+    def extract_vector(self, x):
+        return torch.cat([convnet(x)["features"] for convnet in self.convnets], dim=1)
+
+
+def test_only_new_or_changed_branches_are_re_extracted(fake_cifar10):
+    data_manager = _data_manager()
+    learner = _learner(0, 4)
+    learner._network = _DERNet()
+    learner.build_rehearsal_memory(data_manager, 5)
+
+    learner._network.convnets.append(_Branch(1))
+    old, new = learner._network.convnets
+    old.calls = 0
+    _next_task(learner, data_manager, 4)
+    assert old.calls == 2 * 20  # the new classes only
+    assert new.calls == 4 * 5 + 2 * 20  # the memory, then the new classes
+
+    exemplars = learner._data_memory
+    dataset = data_manager.get_dataset(
+        [], source="train", mode="test", appendent=(exemplars, learner._targets_memory)
+    )
+    inputs = torch.stack([dataset[i][1] for i in range(len(dataset))])
+    with torch.no_grad():
+        vectors = learner._network.extract_vector(inputs).numpy()
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    for class_idx in range(6):
+        mean = vectors[learner._targets_memory == class_idx].mean(axis=0)
+        assert np.allclose(
+            learner._class_means[class_idx], mean / np.linalg.norm(mean), atol=1e-5
+        )
@@ -0,0 +1,51 @@
+import numpy as np
+import torch
+from torch import nn
+from models.base import BaseLearner
+
+
+class _Net(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.fc = nn.Linear(4, 3)
+
+
+def _learner(memory_dir, seed):
+    return BaseLearner(
+        {"memory_size": 20, "memory_dir": str(memory_dir), "seed": seed, "device": ["cpu"]}
+    )
+
+
+def _trained(memory_dir, seed):
+    learner = _learner(memory_dir, seed)
+    learner._network = _Net()
+    learner._cur_task, learner._known_classes, learner._total_classes = 1, 3, 3
+    learner._class_means = np.eye(3, 4)
+    images = np.full((2, 8, 8, 3), seed, dtype=np.uint8)
+    for class_idx in range(3):
+        learner._memory.add(class_idx, images, np.ones((2, 4), dtype=np.float32))
+    learner._memory.save(learner._task_dir(learner._cur_task))
+    learner.save_state({"curve": [seed]})
+    return learner
+
+
+def test_load_state_restores_the_learner_after_a_task(tmp_path):
+    saved = _trained(tmp_path, seed=1993)
+    resumed = _learner(tmp_path, seed=1993)
+    extra = resumed.load_state(1)
+
+    assert extra == {"curve": [1993]}
+    assert (resumed._cur_task, resumed._known_classes, resumed._total_classes) == (1, 3, 3)
+    assert np.array_equal(resumed._class_means, saved._class_means)
+    assert torch.equal(resumed._network.fc.weight, saved._network.fc.weight)
+    assert np.array_equal(resumed._targets_memory, saved._targets_memory)
+    assert resumed.args["seed"] == 1993  # the config is not overwritten
+
+
+def test_seeds_keep_separate_snapshots(tmp_path):
+    _trained(tmp_path, seed=1)
+    _trained(tmp_path, seed=2)
+    for seed in (1, 2):
+        resumed = _learner(tmp_path, seed)
+        assert resumed.load_state(1) == {"curve": [seed]}
+        assert (np.asarray(resumed._data_memory) == seed).all()
@@ -0,0 +1,44 @@
+import numpy as np
+import torch
+from utils.data_manager import DataManager
+from utils.sampler import DeterministicSampler, seeded
+
+
+def test_order_depends_only_on_the_counters():
+    data = range(50)
+    first = list(DeterministicSampler(data, seed=1993, task=2))
+    assert list(DeterministicSampler(data, seed=1993, task=2)) == first
+    assert sorted(idx for idx, _ in first) == list(data)
+    assert list(DeterministicSampler(data, seed=1993, task=3)) != first
+
+
+def test_each_iteration_is_a_new_epoch_and_can_be_resumed():
+    sampler = DeterministicSampler(range(50), seed=0)
+    epoch0, epoch1 = list(sampler), list(sampler)
+    assert epoch0 != epoch1
+    sampler.load_state_dict({"epoch": 1, "start": 20})
+    assert len(sampler) == 30
+    assert list(sampler) == epoch1[20:]
+    assert sampler.state_dict() == {"epoch": 2, "start": 0}
+
+
+def test_seeded_restores_the_global_rng():
+    torch.manual_seed(0)
+    expected = torch.rand(1)
+    torch.manual_seed(0)
+    with seeded(123):
+        inside = (torch.rand(1), np.random.rand())
+    assert torch.equal(torch.rand(1), expected)
+    with seeded(123):
+        assert (torch.rand(1), np.random.rand()) == inside
+
+
+def test_augmented_batches_do_not_depend_on_the_global_rng(fake_cifar10):
+    def first_batch(global_seed):
+        data_manager = DataManager("cifar10", False, 0, 2, 2, sampler_seed=1993)
+        dataset = data_manager.get_dataset([0, 1], source="train", mode="train")
+        torch.manual_seed(global_seed)
+        return next(iter(data_manager.get_loader(dataset, batch_size=8, shuffle=True)))
+
+    a, b = first_batch(0), first_batch(1)
+    assert torch.equal(a[0], b[0]) and torch.equal(a[1], b[1])
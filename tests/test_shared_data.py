@@ -0,0 +1,73 @@
+import pickle
+import numpy as np
+import utils.data_manager
+from utils.data_manager import DataManager
+from utils.shared_data import SharedArray, load_shared
+from conftest import FakeCIFAR10
+
+
+def _data_manager(tmp_path, shared_data):
+    return DataManager(
+        "cifar10",
+        True,
+        1993,
+        4,
+        2,
+        shared_data=shared_data,
+        shared_data_root=str(tmp_path),
+    )
+
+
+def test_shared_arrays_give_the_same_datasets(fake_cifar10, tmp_path):
+    shared, private = _data_manager(tmp_path, True), _data_manager(tmp_path, False)
+    assert isinstance(shared._train_data, SharedArray)
+    assert np.array_equal(shared._train_targets, private._train_targets)
+    for source in ("train", "test"):
+        for classes in ([0, 1, 2, 3], [7, 5]):
+            a = shared.get_dataset(classes, source=source, mode="test", ret_data=True)
+            b = private.get_dataset(classes, source=source, mode="test", ret_data=True)
+            assert np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+
+
+class _CountingCIFAR10(FakeCIFAR10):
+    downloads = 0
+
+    def download_data(self):
+        _CountingCIFAR10.downloads += 1
+        super().download_data()
+
+
+def test_later_runs_attach_without_downloading(tmp_path):
+    first = load_shared("cifar10", _CountingCIFAR10(), str(tmp_path))
+    second = load_shared("cifar10", _CountingCIFAR10(), str(tmp_path))
+    assert _CountingCIFAR10.downloads == 1
+    assert np.array_equal(first["train_data"], second["train_data"])
+
+
+def test_shared_arrays_pickle_as_their_file(fake_cifar10, tmp_path):
+    data = _data_manager(tmp_path, True)._train_data
+    payload = pickle.dumps(data)
+    assert len(payload) < 1000
+    restored = pickle.loads(payload)
+    assert isinstance(restored, SharedArray) and np.array_equal(restored, data)
+    # A slice is not the published array and is sent by value.
+    assert np.array_equal(pickle.loads(pickle.dumps(data[3:5])), data[3:5])
+
+
+class _WideCIFAR10(FakeCIFAR10):
+    # More classes in the order than labels in the data, like imagenet100
+    # run with the 1000-class order of iImageNet.
+    class_order = np.arange(20).tolist()
+
+
+def test_classes_absent_from_the_data_are_empty(monkeypatch, tmp_path):
+    monkeypatch.setattr(utils.data_manager, "_get_idata", lambda name: _WideCIFAR10())
+    shared = DataManager(
+        "cifar10", False, 0, 10, 10, shared_data=True, shared_data_root=str(tmp_path)
+    )
+    private = DataManager("cifar10", False, 0, 10, 10)
+    for classes in ([0, 9], [3, 12]):
+        a = shared.get_dataset(classes, source="train", mode="test", ret_data=True)
+        b = private.get_dataset(classes, source="train", mode="test", ret_data=True)
+        assert np.array_equal(a[0], b[0]) and np.array_equal(a[1], b[1])
+    assert len(shared.get_dataset([15], source="test", mode="test")) == 0
@@ -0,0 +1,14 @@
+import numpy as np
+from utils.toolkit import class_tasks, confusion_counts
+
+
+def test_confusion_counts_rows_are_true_labels():
+    y_true = np.array([0, 0, 1, 2, 2, 2])
+    y_pred = np.array([0, 1, 1, 2, 0, 2])
+    expected = np.zeros((4, 4), dtype=np.int64)
+    np.add.at(expected, (y_true, y_pred), 1)
+    assert np.array_equal(confusion_counts(y_pred, y_true, 4), expected)
+
+
+def test_class_tasks_follow_init_cls_and_increment():
+    assert class_tasks(10, init_cls=4, increment=3).tolist() == [0] * 4 + [1] * 3 + [2] * 3
@@ -0,0 +1,86 @@
+import logging
+import numpy as np
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+from utils.prefetch import DevicePrefetcher, PrefetchStats
+from utils.validation import AsyncValidator
+
+
+def _accuracy(model, loader):
+    correct, total = 0, 0
+    with torch.no_grad():
+        for _, inputs, targets in loader:
+            correct += (model(inputs).argmax(dim=1) == targets).sum().item()
+            total += len(targets)
+    return correct * 100 / total
+
+
+def _dataset():
+    generator = torch.Generator().manual_seed(0)
+    return TensorDataset(
+        torch.arange(64), torch.randn(64, 4, generator=generator), torch.arange(64) % 3
+    )
+
+
+def _logged(caplog):
+    return [r.getMessage() for r in caplog.records if "Test_accy" in r.getMessage()]
+
+
+def test_due_every_interval_epochs():
+    validator = AsyncValidator(_accuracy, "cpu", interval=5)
+    assert [epoch for epoch in range(12) if validator.due(epoch)] == [4, 9]
+    assert not any(AsyncValidator(_accuracy, "cpu", interval=0).due(e) for e in range(12))
+
+
+def test_asynchronous_result_is_that_of_the_submitted_weights(caplog):
+    torch.manual_seed(0)
+    model, loader = nn.Linear(4, 3), DataLoader(_dataset(), batch_size=16)
+    expected = _accuracy(model, loader)
+    validator = AsyncValidator(_accuracy, "cpu")
+    with caplog.at_level(logging.INFO):
+        validator.submit(model, loader, "Epoch 5")
+        with torch.no_grad():
+            model.weight.zero_()  # training goes on; the snapshot is unaffected
+        validator.wait()
+        AsyncValidator(_accuracy, "cpu", asynchronous=False).submit(model, loader, "Sync")
+    assert _logged(caplog) == [
+        "Epoch 5, Test_accy {:.2f}".format(expected),
+        "Sync, Test_accy {:.2f}".format(_accuracy(model, loader)),
+    ]
+
+
+def test_stratified_subset_takes_per_class_samples():
+    dataset = _dataset()
+    dataset.targets = dataset.tensors[2].numpy()
+    validator = AsyncValidator(_accuracy, "cpu", subset="stratified", per_class=5, seed=1)
+    loader = DataLoader(dataset, batch_size=16)
+    subset = validator._loader(loader)
+    assert validator._loader(loader) is subset  # drawn once per test loader
+    targets = np.concatenate([y.numpy() for _, _, y in subset])
+    assert np.array_equal(np.bincount(targets), [5, 5, 5])
+
+
+def _test_loader(stats):
+    return DevicePrefetcher(DataLoader(_dataset(), batch_size=16), "cpu", stats)
+
+
+def test_validation_batches_are_not_counted_as_training_stalls():
+    training_stats = PrefetchStats()
+    loader = _test_loader(training_stats)
+    validator = AsyncValidator(_accuracy, "cpu", interval=1)
+    validator.submit(nn.Linear(4, 3), loader, "Epoch 1")
+    validator.wait()
+    assert training_stats.batches == 0
+    assert validator.stats.batches == 4
+
+
+def test_stratified_validation_keeps_its_own_stats():
+    training_stats = PrefetchStats()
+    loader = _test_loader(training_stats)
+    loader.loader.dataset.targets = loader.loader.dataset.tensors[2].numpy()
+    validator = AsyncValidator(_accuracy, "cpu", subset="stratified", per_class=4)
+    validator.submit(nn.Linear(4, 3), loader, "Epoch 1")
+    validator.wait()
+    assert training_stats.batches == 0
+    assert validator.stats.batches == 1
@@ -44,18 +44,22 @@ def _train(args, file_id):
     _set_random()
     _set_device(args)
     print_args(args)
-    data_manager = DataManager(
-        args["dataset"],
-        args["shuffle"],
-        args["seed"],
-        args["init_cls"],
-        args["increment"],
-    )
+    data_manager = build_data_manager(args)
     model = factory.get_model(args["model_name"], args)
 
     cnn_curve, nme_curve = {"top1": [], "top5": []}, {"top1": [], "top5": []}
     cnn_matrix, nme_matrix = [], []
-    for task in range(data_manager.nb_tasks):
+    start_task = 0
+    if args.get("resume_task", None) is not None:
+        # Continue after a task saved to `memory_dir` by an earlier run.
+        assert args.get("memory_dir", None) is not None, "resume_task needs memory_dir."
+        task = args["resume_task"]
+        saved = model.load_state(task)
+        cnn_curve, nme_curve = saved["cnn_curve"], saved["nme_curve"]
+        cnn_matrix, nme_matrix = saved["cnn_matrix"], saved["nme_matrix"]
+        _set_random_state(saved["random_state"])
+        start_task = task + 1
+    for task in range(start_task, data_manager.nb_tasks):
                 
         logging.info("Main model's params: {}".format(count_parameters(model._network)))
         logging.info(
@@ -64,9 +68,14 @@ def _train(args, file_id):
         if hasattr(model, '_teach_network'):
             if model._teach_network is not None:
                 logging.info("Teacher model's params: {}".format(count_parameters(model._teach_network)))
+        data_manager.set_task(task)
         model.incremental_train(data_manager)
         cnn_accy, nme_accy = model.eval_task()
         model.after_task()
+        logging.info("Loaders: {}".format(data_manager.prefetch_stats))
+        logging.info("Validation loaders: {}".format(model._validation.stats))
+        data_manager.prefetch_stats.reset()
+        model._validation.stats.reset()
 
         if nme_accy is not None:
             logging.info("CNN: {}".format(cnn_accy["grouped"]))
@@ -113,6 +122,17 @@ def _train(args, file_id):
             print('Average Accuracy (CNN):', sum(cnn_curve["top1"])/len(cnn_curve["top1"]))
             logging.info("Average Accuracy (CNN): {} \n".format(sum(cnn_curve["top1"])/len(cnn_curve["top1"])))
 
+        if args.get("memory_dir", None) is not None:
+            model.save_state(
+                {
+                    "cnn_curve": cnn_curve,
+                    "nme_curve": nme_curve,
+                    "cnn_matrix": cnn_matrix,
+                    "nme_matrix": nme_matrix,
+                    "random_state": _get_random_state(),
+                }
+            )
+
         class_count = args["init_cls"] + task*args["increment"]
         if args['dataset'] == 'imagenet100' and class_count >= 100:
             break
@@ -178,6 +198,28 @@ def _train(args, file_id):
     return float(sum(cnn_curve["top1"])/len(cnn_curve["top1"]))
 
     
+def build_data_manager(args):
+    return DataManager(
+        args["dataset"],
+        args["shuffle"],
+        args["seed"],
+        args["init_cls"],
+        args["increment"],
+        image_cache_bytes=args.get("image_cache_bytes", 0),
+        image_cache_policy=args.get("image_cache_policy", "lru"),
+        image_backend=args.get("image_backend", "pil"),
+        image_draft_size=args.get("image_draft_size", 256),
+        stream_dir=args.get("stream_dir", None),
+        stream_shuffle_buffer=args.get("stream_shuffle_buffer", 10000),
+        stream_read_chunk=args.get("stream_read_chunk", 256),
+        prefetch_device=args["device"][0] if args.get("prefetch", True) else None,
+        sampler_seed=args["seed"] if args.get("deterministic_data", False) else None,
+        loader_settings=args.get("loader", None),
+        shared_data=args.get("shared_data", False),
+        shared_data_root=args.get("shared_data_root", None),
+    )
+
+
 def _set_device(args):
     device_type = args["device"]
     gpus = []
@@ -201,6 +243,23 @@ def _set_random():
     torch.backends.cudnn.benchmark = False
 
 
+def _get_random_state():
+    return {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "cuda": torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+    }
+
+
+def _set_random_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"].cpu())
+    if state["cuda"] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all([s.cpu() for s in state["cuda"]])
+
+
 def print_args(args):
     for key, value in args.items():
         logging.info("{}: {}".format(key, value))
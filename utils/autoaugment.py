@@ -200,6 +200,8 @@ class SubPolicy(object):
             "invert": Invert()
         }
 
+        self.name1, self.name2 = operation1, operation2
+        self.fillcolor = fillcolor
         self.p1 = p1
         self.operation1 = func[operation1]
         self.magnitude1 = ranges[operation1][magnitude_idx1]
@@ -213,3 +215,73 @@ class SubPolicy(object):
         if random.random() < self.p2:
             img = self.operation2(img, self.magnitude2)
         return img
+
+
+class BatchPolicy(object):
+    """ Apply an AutoAugment policy to a whole batch on its device.
+
+        Every sample draws its own sub-policy, application coins, and signs;
+        each stage then runs every op once on the samples that chose it. The
+        batch is a float tensor [B, C, H, W] in [0, 1], i.e. collated
+        ToTensor output before Normalize.
+
+        Example:
+        >>> policy = BatchCIFAR10Policy()
+        >>> inputs = normalize(policy(inputs.to(device)))
+    """
+    def __init__(self, policy):
+        subs = policy.policies
+        self.names = sorted(BATCH_OPS)
+        self.fillcolor = subs[0].fillcolor
+        index = {name: i for i, name in enumerate(self.names)}
+        # [nb_policies, 2] tables of op ids, probabilities and magnitudes.
+        self.ops = torch.tensor([[index[p.name1], index[p.name2]] for p in subs])
+        self.probs = torch.tensor([[p.p1, p.p2] for p in subs], dtype=torch.float)
+        self.magnitudes = torch.tensor(
+            [[float(p.magnitude1), float(p.magnitude2)] for p in subs], dtype=torch.float
+        )
+
+    def __call__(self, img):
+        device = img.device
+        b = img.shape[0]
+        choice = torch.randint(len(self.ops), (b,), device=device)
+        ops = self.ops.to(device)[choice]
+        probs = self.probs.to(device)[choice]
+        magnitudes = self.magnitudes.to(device)[choice]
+        applied = torch.rand(b, 2, device=device) < probs
+        signs = torch.randint(0, 2, (b, 2), device=device).float() * 2 - 1
+
+        img = img.clone()
+        for stage in range(2):
+            for op_id in torch.unique(ops[applied[:, stage], stage]).tolist():
+                func, signed = BATCH_OPS[self.names[op_id]]
+                rows = torch.nonzero(applied[:, stage] & (ops[:, stage] == op_id)).squeeze(1)
+                magnitude = magnitudes[rows, stage]
+                if signed:
+                    magnitude = magnitude * signs[rows, stage]
+                img[rows] = func(img[rows], magnitude, self.fillcolor)
+        return img
+
+
+class BatchImageNetPolicy(BatchPolicy):
+    def __init__(self, fillcolor=(128, 128, 128)):
+        super().__init__(ImageNetPolicy(fillcolor))
+
+    def __repr__(self):
+        return "Batched AutoAugment ImageNet Policy"
+
+
+class BatchCIFAR10Policy(BatchPolicy):
+    def __init__(self, fillcolor=(128, 128, 128)):
+        super().__init__(CIFAR10Policy(fillcolor))
+
+    def __repr__(self):
+        return "Batched AutoAugment CIFAR10 Policy"
+
+
+class BatchSVHNPolicy(BatchPolicy):
+    def __init__(self, fillcolor=(128, 128, 128)):
+        super().__init__(SVHNPolicy(fillcolor))
+
+    def __repr__(self):
+        return "Batched AutoAugment SVHN Policy"
@@ -1,15 +1,58 @@
+import functools
 import logging
 import numpy as np
+import torch
 from PIL import Image
-from torch.utils.data import Dataset
+from torch.utils.data import DataLoader, Dataset, IterableDataset
 from torchvision import transforms
 from utils.data import iCIFAR10, iCIFAR100, iImageNet100, iImageNet1000
+from utils.data_stream import StreamingDataset, load_shard_index, read_shards
+from utils.image_cache import DecodedImageCache
+from utils.prefetch import DevicePrefetcher, PrefetchStats
+from utils.sampler import DeterministicSampler, seeded
+from utils.shared_data import load_shared
 from tqdm import tqdm
 
 class DataManager(object):
-    def __init__(self, dataset_name, shuffle, seed, init_cls, increment):
+    def __init__(
+        self,
+        dataset_name,
+        shuffle,
+        seed,
+        init_cls,
+        increment,
+        image_cache_bytes=0,
+        image_cache_policy="lru",
+        image_backend="pil",
+        image_draft_size=256,
+        stream_dir=None,
+        stream_shuffle_buffer=10000,
+        stream_read_chunk=256,
+        prefetch_device=None,
+        sampler_seed=None,
+        loader_settings=None,
+        shared_data=False,
+        shared_data_root=None,
+    ):
         self.dataset_name = dataset_name
+        self._loader_settings = loader_settings if loader_settings is not None else {}
+        self._prefetch_device = prefetch_device
+        self.prefetch_stats = PrefetchStats()
+        self._sampler_seed = sampler_seed
+        self._task, self._nb_task_loaders = 0, 0
+        self._stream_dir = stream_dir
+        self._stream_shuffle_buffer = stream_shuffle_buffer
+        self._stream_read_chunk = stream_read_chunk
+        self._shared_data = shared_data
+        self._shared_data_root = shared_data_root
+        self._seed = seed
         self._setup_data(dataset_name, shuffle, seed)
+        self._image_loader = get_image_loader(image_backend, image_draft_size)
+        self._image_cache = None
+        if self.use_path and image_cache_bytes > 0:
+            self._image_cache = DecodedImageCache(
+                self._image_loader, image_cache_bytes, policy=image_cache_policy
+            )
         assert init_cls <= len(self._class_order), "No enough classes."
         self._increments = [init_cls]
         while sum(self._increments) + increment < len(self._class_order):
@@ -22,6 +65,9 @@ class DataManager(object):
     def nb_tasks(self):
         return len(self._increments)
 
+    def set_task(self, task):
+        self._task, self._nb_task_loaders = task, 0
+
     def get_task_size(self, task):
         return self._increments[task]
     
@@ -31,20 +77,11 @@ class DataManager(object):
     def get_total_classnum(self):
         return len(self._class_order)
 
-    def get_dataset(
-        self, indices, source, mode, appendent=None, ret_data=False, m_rate=None
-    ):
-        if source == "train":
-            x, y = self._train_data, self._train_targets
-        elif source == "test":
-            x, y = self._test_data, self._test_targets
-        else:
-            raise ValueError("Unknown data source {}.".format(source))
-
+    def get_transform(self, mode):
         if mode == "train":
-            trsf = transforms.Compose([*self._train_trsf, *self._common_trsf])
+            return transforms.Compose([*self._train_trsf, *self._common_trsf])
         elif mode == "flip":
-            trsf = transforms.Compose(
+            return transforms.Compose(
                 [
                     *self._test_trsf,
                     transforms.RandomHorizontalFlip(p=1.0),
@@ -52,65 +89,114 @@ class DataManager(object):
                 ]
             )
         elif mode == "test":
-            trsf = transforms.Compose([*self._test_trsf, *self._common_trsf])
+            return transforms.Compose([*self._test_trsf, *self._common_trsf])
         else:
             raise ValueError("Unknown mode {}.".format(mode))
 
-        data, targets = [], []
-        for idx in indices:
-            if m_rate is None:
-                class_data, class_targets = self._select(
-                    x, y, low_range=idx, high_range=idx + 1
-                )
-            else:
-                class_data, class_targets = self._select_rmm(
-                    x, y, low_range=idx, high_range=idx + 1, m_rate=m_rate
-                )
-            data.append(class_data)
-            targets.append(class_targets)
-
-        if appendent is not None and len(appendent) != 0:
-            appendent_data, appendent_targets = appendent
-            data.append(appendent_data)
-            targets.append(appendent_targets)
+    def get_loader(self, dataset, batch_size, shuffle=False, num_workers=0, **kwargs):
+        # Tuned settings for the dataset's mode (see `benchmark.py loader`)
+        # override what the model asked for.
+        settings = self._loader_settings.get(getattr(dataset, "mode", None), {})
+        num_workers = settings.get("num_workers", num_workers)
+        if "pin_memory" in settings:
+            kwargs["pin_memory"] = settings["pin_memory"]
+        if "prefetch_factor" in settings and num_workers > 0:
+            kwargs["prefetch_factor"] = settings["prefetch_factor"]
+        if self._prefetch_device is not None:
+            kwargs.setdefault(
+                "pin_memory", torch.device(self._prefetch_device).type == "cuda"
+            )
+        if shuffle and self._sampler_seed is not None and not isinstance(
+            dataset, IterableDataset
+        ):
+            # Order and augmentation keyed by (seed, task, loader, epoch, sample).
+            kwargs["sampler"] = DeterministicSampler(
+                dataset, self._sampler_seed, self._task, self._nb_task_loaders
+            )
+            self._nb_task_loaders += 1
+            shuffle = False
+        if isinstance(dataset, IterableDataset):
+            # Streaming datasets shuffle through their own buffer.
+            dataset.shuffle = shuffle
+            loader = DataLoader(
+                dataset, batch_size=batch_size, num_workers=num_workers, **kwargs
+            )
+        else:
+            loader = DataLoader(
+                dataset,
+                batch_size=batch_size,
+                shuffle=shuffle,
+                num_workers=num_workers,
+                **kwargs
+            )
+        if self._prefetch_device is not None:
+            return DevicePrefetcher(loader, self._prefetch_device, self.prefetch_stats)
+        return loader
 
-        data, targets = np.concatenate(data), np.concatenate(targets)
+    def get_dataset(
+        self, indices, source, mode, appendent=None, ret_data=False, m_rate=None
+    ):
+        trsf = self.get_transform(mode)
+        if (
+            self._stream_dir is not None
+            and len(indices) != 0
+            and not ret_data
+            and m_rate is None
+        ):
+            return StreamingDataset(
+                self._get_shards(source, indices),
+                trsf,
+                self.use_path,
+                self._get_loader(mode),
+                appendent=appendent if appendent is not None and len(appendent) != 0 else None,
+                shuffle=mode == "train",
+                shuffle_buffer=self._stream_shuffle_buffer,
+                read_chunk=self._stream_read_chunk,
+                mode=mode,
+                seed=self._seed,
+            )
+        x, y, class_index = self._get_source(source, indices)
 
+        if m_rate is None:
+            idxes = _class_indices(class_index, indices)
+        else:
+            idxes = np.concatenate(
+                [
+                    self._select_rmm(_class_indices(class_index, [idx]), m_rate)
+                    for idx in indices
+                ]
+                + [np.array([], dtype=np.int64)]
+            )
+        if appendent is not None and len(appendent) == 0:
+            appendent = None
+
+        dataset = DummyDataset(
+            x,
+            y,
+            trsf,
+            self.use_path,
+            self._get_loader(mode),
+            indices=idxes,
+            appendent=appendent,
+            mode=mode,
+        )
         if ret_data:
-            return data, targets, DummyDataset(data, targets, trsf, self.use_path)
+            data, targets = dataset.get_data()
+            return data, targets, dataset
         else:
-            return DummyDataset(data, targets, trsf, self.use_path)
+            return dataset
 
         
     def get_finetune_dataset(self,known_classes,total_classes,source,mode,appendent,type="ratio"):
-        if source == 'train':
-            x, y = self._train_data, self._train_targets
-        elif source == 'test':
-            x, y = self._test_data, self._test_targets
-        else:
-            raise ValueError('Unknown data source {}.'.format(source))
-
-        if mode == 'train':
-            trsf = transforms.Compose([*self._train_trsf, *self._common_trsf])
-        elif mode == 'test':
-            trsf = transforms.Compose([*self._test_trsf, *self._common_trsf])
-        else:
-            raise ValueError('Unknown mode {}.'.format(mode))
-        val_data = []
-        val_targets = []
+        x, y, class_index = self._get_source(source, range(known_classes, total_classes))
+        trsf = self.get_transform(mode)
 
-        old_num_tot = 0
+        # All exemplars of the old classes, grouped by class.
         appendent_data, appendent_targets = appendent
+        old_rows = np.where(appendent_targets < known_classes)[0]
+        old_rows = old_rows[np.argsort(appendent_targets[old_rows], kind="stable")]
+        old_num_tot = len(old_rows)
 
-        for idx in range(0, known_classes):
-            append_data, append_targets = self._select(appendent_data, appendent_targets,
-                                                       low_range=idx, high_range=idx+1)
-            num=len(append_data)
-            if num == 0:
-                continue
-            old_num_tot += num
-            val_data.append(append_data)
-            val_targets.append(append_targets)
         if type == "ratio":
             new_num_tot = int(old_num_tot*(total_classes-known_classes)/known_classes)
         elif type == "same":
@@ -118,78 +204,85 @@ class DataManager(object):
         else:
             assert 0, "not implemented yet"
         new_num_average = int(new_num_tot/(total_classes-known_classes))
-        for idx in range(known_classes,total_classes):
-            class_data, class_targets = self._select(x, y, low_range=idx, high_range=idx+1)
-            val_indx = np.random.choice(len(class_data),new_num_average, replace=False)
-            val_data.append(class_data[val_indx])
-            val_targets.append(class_targets[val_indx])
-        val_data=np.concatenate(val_data)
-        val_targets = np.concatenate(val_targets)
-        return DummyDataset(val_data, val_targets, trsf, self.use_path)
+
+        new_rows = _class_indices(class_index, range(known_classes, total_classes))
+        new_rows, _ = _split_per_class(new_rows, y[new_rows], new_num_average)
+        return DummyDataset(
+            x,
+            y,
+            trsf,
+            self.use_path,
+            self._get_loader(mode),
+            indices=new_rows,
+            appendent=(appendent_data[old_rows], appendent_targets[old_rows]),
+            mode=mode,
+        )
 
     def get_dataset_with_split(
         self, indices, source, mode, appendent=None, val_samples_per_class=0
     ):
-        if source == "train":
-            x, y = self._train_data, self._train_targets
-        elif source == "test":
-            x, y = self._test_data, self._test_targets
-        else:
-            raise ValueError("Unknown data source {}.".format(source))
-
-        if mode == "train":
-            trsf = transforms.Compose([*self._train_trsf, *self._common_trsf])
-        elif mode == "test":
-            trsf = transforms.Compose([*self._test_trsf, *self._common_trsf])
-        else:
-            raise ValueError("Unknown mode {}.".format(mode))
+        x, y, class_index = self._get_source(source, indices)
+        trsf = self.get_transform(mode)
 
-        train_data, train_targets = [], []
-        val_data, val_targets = [], []
-        for idx in indices:
-            class_data, class_targets = self._select(
-                x, y, low_range=idx, high_range=idx + 1
-            )
-            val_indx = np.random.choice(
-                len(class_data), val_samples_per_class, replace=False
-            )
-            train_indx = list(set(np.arange(len(class_data))) - set(val_indx))
-            val_data.append(class_data[val_indx])
-            val_targets.append(class_targets[val_indx])
-            train_data.append(class_data[train_indx])
-            train_targets.append(class_targets[train_indx])
+        rows = _class_indices(class_index, indices)
+        val_rows, train_rows = _split_per_class(rows, y[rows], val_samples_per_class)
 
+        train_appendent, val_appendent = None, None
         if appendent is not None:
             appendent_data, appendent_targets = appendent
-            for idx in range(0, int(np.max(appendent_targets)) + 1):
-                append_data, append_targets = self._select(
-                    appendent_data, appendent_targets, low_range=idx, high_range=idx + 1
-                )
-                val_indx = np.random.choice(
-                    len(append_data), val_samples_per_class, replace=False
-                )
-                train_indx = list(set(np.arange(len(append_data))) - set(val_indx))
-                val_data.append(append_data[val_indx])
-                val_targets.append(append_targets[val_indx])
-                train_data.append(append_data[train_indx])
-                train_targets.append(append_targets[train_indx])
-
-        train_data, train_targets = np.concatenate(train_data), np.concatenate(
-            train_targets
-        )
-        val_data, val_targets = np.concatenate(val_data), np.concatenate(val_targets)
+            val_app, train_app = _split_per_class(
+                np.arange(len(appendent_targets)),
+                appendent_targets,
+                val_samples_per_class,
+            )
+            train_appendent = (appendent_data[train_app], appendent_targets[train_app])
+            val_appendent = (appendent_data[val_app], appendent_targets[val_app])
 
+        loader = self._get_loader(mode)
         return DummyDataset(
-            train_data, train_targets, trsf, self.use_path
-        ), DummyDataset(val_data, val_targets, trsf, self.use_path)
+            x,
+            y,
+            trsf,
+            self.use_path,
+            loader,
+            indices=train_rows,
+            appendent=train_appendent,
+            mode=mode,
+        ), DummyDataset(
+            x,
+            y,
+            trsf,
+            self.use_path,
+            loader,
+            indices=val_rows,
+            appendent=val_appendent,
+            mode=mode,
+        )
 
     def _setup_data(self, dataset_name, shuffle, seed):
         idata = _get_idata(dataset_name)
-        idata.download_data()
 
         # Data
-        self._train_data, self._train_targets = idata.train_data, idata.train_targets
-        self._test_data, self._test_targets = idata.test_data, idata.test_targets
+        shared_index = None
+        if self._stream_dir is None and self._shared_data:
+            arrays = load_shared(dataset_name, idata, self._shared_data_root)
+            self._train_data, self._train_targets = arrays["train_data"], arrays["train_targets"]
+            self._test_data, self._test_targets = arrays["test_data"], arrays["test_targets"]
+            shared_index = {
+                source: (arrays[source + "_rows"], arrays[source + "_offsets"])
+                for source in ("train", "test")
+            }
+        elif self._stream_dir is None:
+            idata.download_data()
+            self._train_data, self._train_targets = idata.train_data, idata.train_targets
+            self._test_data, self._test_targets = idata.test_data, idata.test_targets
+        else:
+            # Only the shard index is loaded; images are read per task.
+            self._train_shards = load_shard_index(self._stream_dir, "train")
+            self._test_shards = load_shard_index(self._stream_dir, "test")
+            self._train_data, self._test_data = None, None
+            self._train_targets = _shard_targets(self._train_shards)
+            self._test_targets = _shard_targets(self._test_shards)
         self.use_path = idata.use_path
 
         # Transforms
@@ -212,30 +305,61 @@ class DataManager(object):
             self._train_targets, self._class_order
         )
         self._test_targets = _map_new_class_index(self._test_targets, self._class_order)
-
-    def _select(self, x, y, low_range, high_range):
-        idxes = np.where(np.logical_and(y >= low_range, y < high_range))[0]
-        
-        if isinstance(x,np.ndarray):
-            x_return = x[idxes]
+        if shared_index is not None:
+            self._class_index = {
+                source: _reorder_class_index(shared_index[source], order)
+                for source in ("train", "test")
+            }
+        elif self._stream_dir is None:
+            self._class_index = {
+                "train": _build_class_index(self._train_targets, len(order)),
+                "test": _build_class_index(self._test_targets, len(order)),
+            }
         else:
-            x_return = []
-            for id in idxes:
-                x_return.append(x[id])
-        return x_return, y[idxes]
+            for shard in self._train_shards + self._test_shards:
+                shard["label"] = self._class_order.index(shard["class"])
 
-    def _select_rmm(self, x, y, low_range, high_range, m_rate):
+    def _get_source(self, source, indices):
+        if source == "train":
+            x, y = self._train_data, self._train_targets
+        elif source == "test":
+            x, y = self._test_data, self._test_targets
+        else:
+            raise ValueError("Unknown data source {}.".format(source))
+        if self._stream_dir is not None:
+            # Materialize only the requested classes.
+            shards = self._get_shards(source, indices)
+            x = read_shards(shards)
+            y = np.concatenate(
+                [np.full(shard["length"], shard["label"]) for shard in shards]
+                + [np.array([], dtype=y.dtype)]
+            )
+            return x, y, _build_class_index(y, len(self._class_order))
+        return x, y, self._class_index[source]
+
+    def _get_shards(self, source, indices):
+        shards = self._train_shards if source == "train" else self._test_shards
+        indices = set(int(idx) for idx in indices)
+        return [shard for shard in shards if shard["label"] in indices]
+
+    def _get_loader(self, mode):
+        # Deterministic passes re-read the same files every task; serve them
+        # from the decoded cache. Augmented training reads bypass it.
+        if self._image_cache is not None and mode in ("test", "flip"):
+            return self._image_cache
+        return self._image_loader
+
+    def _select_rmm(self, idxes, m_rate):
         assert m_rate is not None
         if m_rate != 0:
-            idxes = np.where(np.logical_and(y >= low_range, y < high_range))[0]
             selected_idxes = np.random.randint(
                 0, len(idxes), size=int((1 - m_rate) * len(idxes))
             )
             new_idxes = idxes[selected_idxes]
             new_idxes = np.sort(new_idxes)
         else:
-            new_idxes = np.where(np.logical_and(y >= low_range, y < high_range))[0]
-        return x[new_idxes], y[new_idxes]
+            new_idxes = idxes
+        return new_idxes
 
     def getlen(self, index):
         y = self._train_targets
@@ -243,28 +367,139 @@ class DataManager(object):
 
 
 class DummyDataset(Dataset):
-    def __init__(self, images, labels, trsf, use_path=False):
+    """
+    A view over `images`/`labels`: `indices` selects their rows (all rows if
+    None) and `appendent` is an (images, labels) pair served after them.
+    Neither is copied, so building a task dataset costs O(len(indices)).
+    """
+
+    def __init__(
+        self,
+        images,
+        labels,
+        trsf,
+        use_path=False,
+        loader=None,
+        indices=None,
+        appendent=None,
+        mode=None,
+    ):
         assert len(images) == len(labels), "Data size error!"
+        if appendent is not None:
+            assert len(appendent[0]) == len(appendent[1]), "Data size error!"
         self.images = images
         self.labels = labels
+        self.indices = indices
+        self.appendent = appendent
+        self.mode = mode
         self.trsf = trsf
         self.use_path = use_path
+        self.loader = loader if loader is not None else pil_loader
+        self._nb_base = len(labels) if indices is None else len(indices)
 
     def __len__(self):
-        return len(self.images)
+        if self.appendent is None:
+            return self._nb_base
+        return self._nb_base + len(self.appendent[1])
+
+    @property
+    def targets(self):
+        """Labels of all items, in order, without loading any image."""
+        labels = self.labels if self.indices is None else self.labels[self.indices]
+        if self.appendent is None:
+            return np.asarray(labels)
+        return np.concatenate([labels, self.appendent[1]])
 
     def __getitem__(self, idx):
+        if isinstance(idx, tuple):
+            # (index, key) from DeterministicSampler: seed this sample's augmentation.
+            idx, key = idx
+            with seeded(key):
+                return self._getitem(idx)
+        return self._getitem(idx)
+
+    def _getitem(self, idx):
+        if idx < self._nb_base:
+            row = idx if self.indices is None else self.indices[idx]
+            image, label = self.images[row], self.labels[row]
+        else:
+            image = self.appendent[0][idx - self._nb_base]
+            label = self.appendent[1][idx - self._nb_base]
         if self.use_path:
-            image = self.trsf(pil_loader(self.images[idx]))
+            image = self.trsf(self.loader(image))
         else:
-            image = self.trsf(Image.fromarray(self.images[idx]))
-        label = self.labels[idx]
+            image = self.trsf(Image.fromarray(image))
 
         return idx, image, label
 
+    def get_data(self):
+        """Materialize (copy) the viewed images and labels."""
+        data, targets = [], []
+        if self._nb_base != 0:
+            rows = slice(None) if self.indices is None else self.indices
+            data.append(self.images[rows])
+            targets.append(self.labels[rows])
+        if self.appendent is not None:
+            data.append(self.appendent[0])
+            targets.append(self.appendent[1])
+        if len(data) == 0:
+            return np.array([]), np.array([])
+        return np.concatenate(data), np.concatenate(targets)
+
+
+def _build_class_index(y, nb_classes):
+    # Rows of each class are order[offsets[c]:offsets[c + 1]], in ascending order.
+    order = np.argsort(y, kind="stable")
+    offsets = np.searchsorted(y[order], np.arange(nb_classes + 1))
+    return order, offsets
+
+
+def _reorder_class_index(class_index, order):
+    # Class index of the original labels -> class index of the mapped labels,
+    # where mapped class c is original class order[c]. Classes past the last
+    # label of the data (e.g. a 1000-class order) get empty ranges.
+    rows, offsets = class_index
+    missing = max(order) + 2 - len(offsets)
+    if missing > 0:
+        offsets = np.concatenate([offsets, np.full(missing, offsets[-1])])
+    counts = np.diff(offsets)[order]
+    return (
+        np.concatenate([rows[offsets[c] : offsets[c + 1]] for c in order]),
+        np.concatenate([[0], np.cumsum(counts)]),
+    )
+
+
+def _class_indices(class_index, indices):
+    order, offsets = class_index
+    return np.concatenate(
+        [order[offsets[idx] : offsets[idx + 1]] for idx in indices]
+        + [np.array([], dtype=order.dtype)]
+    )
+
+
+def _split_per_class(rows, labels, nb_picked):
+    """
+    Randomly pick `nb_picked` of the `rows` of every label, returning
+    (picked, rest). One permutation plus a stable sort by label groups the
+    rows with a random order inside each class; the first `nb_picked` of each
+    group are picked.
+    """
+    order = np.random.permutation(len(rows))
+    order = order[np.argsort(labels[order], kind="stable")]
+    grouped = labels[order]
+    rank = np.arange(len(order)) - np.searchsorted(grouped, grouped, side="left")
+    picked = rank < nb_picked
+    return rows[order[picked]], rows[order[~picked]]
+
+
+def _shard_targets(shards):
+    return np.concatenate([np.full(shard["length"], shard["class"]) for shard in shards])
+
 
 def _map_new_class_index(y, order):
-    return np.array(list(map(lambda x: order.index(x), y)))
+    lookup = np.zeros(max(order) + 1, dtype=np.int64)
+    lookup[order] = np.arange(len(order))
+    return lookup[y]
 
 
 def _get_idata(dataset_name):
@@ -308,6 +543,61 @@ def accimage_loader(path):
         return pil_loader(path)
 
 
+def pil_draft_loader(path, size=256):
+    """
+    Decode a JPEG at a reduced DCT scale (1/2, 1/4 or 1/8) such that both sides
+    stay >= `size`, so that a following Resize(size)/RandomResizedCrop works on a
+    much smaller bitmap. Non-JPEG files are decoded at full resolution.
+    """
+    with open(path, "rb") as f:
+        img = Image.open(f)
+        if img.format == "JPEG":
+            img.draft("RGB", (size, size))
+        return img.convert("RGB")
+
+
+def torchvision_loader(path):
+    """
+    Decode with torchvision.io (libjpeg-turbo) and hand a PIL image to the
+    transform pipeline. Falls back to PIL for files it cannot decode.
+    """
+    from torchvision.io import ImageReadMode, decode_jpeg, read_file
+
+    try:
+        image = decode_jpeg(read_file(path), mode=ImageReadMode.RGB)
+    except RuntimeError:
+        return pil_loader(path)
+    return Image.fromarray(image.permute(1, 2, 0).numpy())
+
+
+def accimage_pil_loader(path):
+    """
+    Decode with accimage (Intel IPP) and hand a PIL image to the transform
+    pipeline: the decoded-image cache and transforms such as ColorJitter do
+    not accept accimage images.
+    """
+    image = accimage_loader(path)
+    if isinstance(image, Image.Image):
+        return image  # accimage could not decode it; PIL did
+    array = np.empty((image.channels, image.height, image.width), dtype=np.uint8)
+    image.copyto(array)
+    return Image.fromarray(array.transpose(1, 2, 0))
+
+
+def get_image_loader(backend, draft_size=256):
+    name = backend.lower()
+    if name == "pil":
+        return pil_loader
+    elif name == "pil_draft":
+        return functools.partial(pil_draft_loader, size=draft_size)
+    elif name == "torchvision":
+        return torchvision_loader
+    elif name == "accimage":
+        return accimage_pil_loader
+    else:
+        raise NotImplementedError("Unknown image backend {}.".format(backend))
+
+
 def default_loader(path):
     """
     Ref:
@@ -0,0 +1,164 @@
+import argparse
+import json
+import logging
+import os
+import numpy as np
+from PIL import Image
+from torch.utils.data import IterableDataset, get_worker_info
+from utils.sampler import stream_key
+
+
+def export_shards(idata, out_dir, shard_size=4096):
+    """Write the train/test splits of `idata` as per-class ``.npy`` shards.
+
+    Shards never mix classes, so a task only touches the files of its own
+    classes. ``<split>.json`` lists ``{"class", "file", "length"}`` per shard
+    with the original (unmapped) class labels.
+    """
+    idata.download_data()
+    os.makedirs(out_dir, exist_ok=True)
+    for split, data, targets in (
+        ("train", idata.train_data, idata.train_targets),
+        ("test", idata.test_data, idata.test_targets),
+    ):
+        shards = []
+        for cls in np.unique(targets):
+            idxes = np.where(targets == cls)[0]
+            for k, start in enumerate(range(0, len(idxes), shard_size)):
+                name = "{}_{:05d}_{:03d}.npy".format(split, cls, k)
+                part = np.asarray(data[idxes[start : start + shard_size]])
+                np.save(os.path.join(out_dir, name), part)
+                shards.append({"class": int(cls), "file": name, "length": len(part)})
+        with open(os.path.join(out_dir, "{}.json".format(split)), "w") as f:
+            json.dump(shards, f)
+        logging.info("Wrote {} {} shards to {}".format(len(shards), split, out_dir))
+
+
+def load_shard_index(stream_dir, split):
+    with open(os.path.join(stream_dir, "{}.json".format(split))) as f:
+        shards = json.load(f)
+    for shard in shards:
+        shard["file"] = os.path.join(stream_dir, shard["file"])
+    return shards
+
+
+def read_shards(shards):
+    """Materialize a (small) set of shards, e.g. one class for herding."""
+    if len(shards) == 0:
+        return np.array([])
+    return np.concatenate([np.load(shard["file"], mmap_mode="r") for shard in shards])
+
+
+class StreamingDataset(IterableDataset):
+    """Iterate per-class shards lazily with bounded memory.
+
+    Each DataLoader worker reads its share of the shards `read_chunk` samples
+    at a time, and (if `shuffle`) mixes them through a buffer of at most
+    `shuffle_buffer` samples. The in-memory `appendent` (the exemplar set) is
+    streamed as one more shard. Labels of a shard are its mapped class index.
+    The shuffle is keyed by (`seed`, epoch, worker), so it changes every epoch
+    with or without worker processes.
+    """
+
+    def __init__(
+        self,
+        shards,
+        trsf,
+        use_path=False,
+        loader=None,
+        appendent=None,
+        shuffle=False,
+        shuffle_buffer=10000,
+        read_chunk=256,
+        mode=None,
+        seed=0,
+    ):
+        self.shards = shards
+        self.trsf = trsf
+        self.use_path = use_path
+        self.loader = loader
+        self.appendent = appendent
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.read_chunk = read_chunk
+        self.mode = mode
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        length = sum(shard["length"] for shard in self.shards)
+        if self.appendent is not None:
+            length += len(self.appendent[1])
+        return length
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, nb_workers = (0, 1) if worker is None else (worker.id, worker.num_workers)
+        epoch, self.epoch = self.epoch, self.epoch + 1
+        # Worker copies are rebuilt each epoch unless persistent, but their
+        # seed is drawn anew by the DataLoader; the main process counts epochs.
+        base = self.seed if worker is None else worker.seed
+        rng = np.random.RandomState(stream_key(base, epoch, worker_id) % 2**32)
+
+        sources = list(self.shards[worker_id::nb_workers])
+        if self.appendent is not None and len(self.appendent[1]) != 0:
+            data, targets = self.appendent
+            sources.append((data[worker_id::nb_workers], targets[worker_id::nb_workers]))
+        if self.shuffle:
+            sources = [sources[i] for i in rng.permutation(len(sources))]
+
+        buffer = []
+        position = worker_id
+        for images, labels in self._read(sources, rng):
+            for image, label in zip(images, labels):
+                if not self.shuffle:
+                    yield self._item(position, image, label)
+                    position += nb_workers
+                    continue
+                if len(buffer) < self.shuffle_buffer:
+                    buffer.append((image, label))
+                    continue
+                i = rng.randint(len(buffer))
+                buffer[i], (image, label) = (image, label), buffer[i]
+                yield self._item(position, image, label)
+                position += nb_workers
+
+        if self.shuffle:
+            for i in rng.permutation(len(buffer)):
+                yield self._item(position, *buffer[i])
+                position += nb_workers
+
+    def _read(self, sources, rng):
+        for source in sources:
+            if isinstance(source, dict):
+                array = np.load(source["file"], mmap_mode="r")
+                labels = np.full(len(array), source["label"])
+            else:
+                array, labels = source
+            for start in range(0, len(array), self.read_chunk):
+                chunk = np.asarray(array[start : start + self.read_chunk])
+                chunk_labels = labels[start : start + self.read_chunk]
+                if self.shuffle:
+                    order = rng.permutation(len(chunk))
+                    chunk, chunk_labels = chunk[order], chunk_labels[order]
+                yield chunk, chunk_labels
+
+    def _item(self, idx, image, label):
+        if self.use_path:
+            image = self.trsf(self.loader(image))
+        else:
+            image = self.trsf(Image.fromarray(image))
+        return idx, image, label
+
+
+if __name__ == "__main__":
+    from utils.data_manager import _get_idata
+
+    parser = argparse.ArgumentParser(description="Export a dataset as class shards.")
+    parser.add_argument("--dataset", type=str, required=True)
+    parser.add_argument("--out", type=str, required=True)
+    parser.add_argument("--shard_size", type=int, default=4096)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    export_shards(_get_idata(args.dataset), args.out, args.shard_size)
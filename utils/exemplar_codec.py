@@ -0,0 +1,117 @@
+import io
+import numpy as np
+from PIL import Image
+
+
+class RawCodec(object):
+    """Lossless: exemplars are stored as given (images or paths)."""
+
+    name = "raw"
+
+    def encode(self, images):
+        return np.asarray(images)
+
+    def decode(self, item):
+        return item
+
+    def config(self):
+        return {"name": self.name}
+
+
+class JPEGCodec(object):
+    """JPEG at `quality`, stored as fixed-width byte strings."""
+
+    name = "jpeg"
+
+    def __init__(self, quality=90):
+        self.quality = quality
+
+    def encode(self, images):
+        encoded = []
+        for image in images:
+            buffer = io.BytesIO()
+            Image.fromarray(image).save(buffer, format="JPEG", quality=self.quality)
+            encoded.append(buffer.getvalue())
+        # A JPEG stream ends with an EOI marker, so the zero padding of the
+        # fixed-width dtype is never part of the data.
+        return np.array(encoded, dtype=bytes)
+
+    def decode(self, item):
+        return np.asarray(Image.open(io.BytesIO(bytes(item))).convert("RGB"))
+
+    def config(self):
+        return {"name": self.name, "quality": self.quality}
+
+
+class DownsampleCodec(object):
+    """Stores images shrunk by `factor` and upsamples them back on decode."""
+
+    name = "downsample"
+
+    def __init__(self, factor=2):
+        self.factor = factor
+
+    def encode(self, images):
+        return np.stack(
+            [
+                np.asarray(
+                    Image.fromarray(image).resize(
+                        (image.shape[1] // self.factor, image.shape[0] // self.factor),
+                        Image.BILINEAR,
+                    )
+                )
+                for image in images
+            ]
+        )
+
+    def decode(self, item):
+        size = (item.shape[1] * self.factor, item.shape[0] * self.factor)
+        return np.asarray(Image.fromarray(item).resize(size, Image.BILINEAR))
+
+    def config(self):
+        return {"name": self.name, "factor": self.factor}
+
+
+def get_codec(name="raw", **kwargs):
+    name = name.lower()
+    if name == "raw":
+        return RawCodec()
+    elif name == "jpeg":
+        return JPEGCodec(**kwargs)
+    elif name == "downsample":
+        return DownsampleCodec(**kwargs)
+    else:
+        raise NotImplementedError("Unknown exemplar codec {}.".format(name))
+
+
+def encoded_bytes(encoded):
+    # Bytes per stored sample, including any fixed-width padding.
+    return encoded.itemsize * int(np.prod(encoded.shape[1:]))
+
+
+class EncodedImages(object):
+    """
+    Array-like view of encoded exemplars that decodes on access: an integer
+    index returns one decoded image, any other index a sub-view, and
+    ``np.asarray`` decodes everything. DataLoader workers therefore decode
+    only the samples of their batches.
+    """
+
+    def __init__(self, encoded, codec):
+        self.encoded = encoded
+        self.codec = codec
+
+    def __len__(self):
+        return len(self.encoded)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return self.codec.decode(self.encoded[idx])
+        return EncodedImages(self.encoded[idx], self.codec)
+
+    def __array__(self, dtype=None, copy=None):
+        if len(self.encoded) == 0:
+            images = np.array([])
+        else:
+            images = np.stack([self.codec.decode(item) for item in self.encoded])
+        return images if dtype is None else images.astype(dtype)
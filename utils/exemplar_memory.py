@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import numpy as np
+from utils.exemplar_codec import EncodedImages, get_codec
+
+
+class ExemplarMemory(object):
+    """
+    Rehearsal memory in preallocated arrays, one contiguous slot per class in
+    insertion order. Samples (images or paths), targets and, optionally, the
+    normalized features of every exemplar share the slot layout. `data`,
+    `targets` and `vectors` are zero-copy views of the filled part.
+
+    Shrinking keeps the first `m` exemplars of each class and compacts the
+    slots in place; the arrays only grow (by doubling) when `capacity` is
+    exceeded, e.g. with ``fixed_memory``.
+
+    Samples are stored through `codec` (see `utils.exemplar_codec`); `data`
+    then decodes on access. With ``vector_dtype="int8"`` features are kept
+    quantized with one scale per exemplar.
+
+    `save` writes the filled part as ``.npy`` files plus ``index.json``
+    (class -> slot); within a slot, exemplars are kept in herding order.
+    `load` memory-maps them copy-on-write, so loading is instant and runs
+    that start from the same snapshot share its pages until they modify it.
+    """
+
+    def __init__(self, capacity, codec=None, vector_dtype="float32"):
+        assert vector_dtype in ("float32", "int8"), "Unknown vector dtype."
+        self.capacity = max(int(capacity), 1)
+        self.codec = codec if codec is not None else get_codec("raw")
+        self.vector_dtype = vector_dtype
+        self._data, self._targets, self._vectors, self._scales = None, None, None, None
+        self._slots = {}  # class -> (start, count)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def classes(self):
+        return list(self._slots)
+
+    @property
+    def encoded(self):
+        return self._data[: self._size] if self._data is not None else np.array([])
+
+    @property
+    def data(self):
+        if self.codec.name == "raw" or self._data is None:
+            return self.encoded
+        return EncodedImages(self.encoded, self.codec)
+
+    @property
+    def targets(self):
+        return (
+            self._targets[: self._size] if self._targets is not None else np.array([])
+        )
+
+    @property
+    def vectors(self):
+        """Exemplar features, or None if some exemplar has none."""
+        if self._vectors is None or self._size == 0:
+            return None
+        if self._scales is not None:
+            return self._vectors[: self._size] * self._scales[: self._size, None]
+        return self._vectors[: self._size]
+
+    def get(self):
+        # The `appendent` of DataManager.get_dataset.
+        return (self.data, self.targets) if self._size > 0 else None
+
+    def rows(self, class_idx):
+        start, count = self._slots[class_idx]
+        return slice(start, start + count)
+
+    def segments(self):
+        """(classes, counts) of the slots, in memory order."""
+        return list(self._slots), [count for _, count in self._slots.values()]
+
+    def add(self, class_idx, data, vectors=None):
+        assert class_idx not in self._slots, "Class {} already stored.".format(class_idx)
+        data = self.codec.encode(data)
+        count = len(data)
+        self._reserve(self._size + count, data, vectors)
+        start = self._size
+        self._data[start : start + count] = data
+        self._targets[start : start + count] = class_idx
+        self._slots[class_idx] = (start, count)
+        self._size += count
+        if vectors is not None and self._vectors is not None:
+            self._store_vectors(self.rows(class_idx), vectors)
+        elif count > 0:
+            self._vectors, self._scales = None, None
+
+    def set_vectors(self, class_idx, vectors):
+        if self._vectors is None:
+            self._allocate_vectors(np.shape(vectors)[1])
+        self._store_vectors(self.rows(class_idx), vectors)
+
+    def replace_vectors(self, vectors):
+        """Replace the features of all exemplars, possibly with a new width."""
+        self._allocate_vectors(np.shape(vectors)[1])
+        self._store_vectors(slice(0, self._size), vectors)
+
+    def _allocate_vectors(self, dim):
+        dtype = np.int8 if self.vector_dtype == "int8" else np.float32
+        self._vectors = np.zeros((self.capacity, dim), dtype=dtype)
+        if self.vector_dtype == "int8":
+            self._scales = np.zeros(self.capacity, dtype=np.float32)
+
+    def _store_vectors(self, rows, vectors):
+        if self._scales is None:
+            self._vectors[rows] = vectors
+            return
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1
+        self._vectors[rows] = np.round(vectors / scales[:, None])
+        self._scales[rows] = scales
+
+    def reduce(self, m):
+        """Keep the first `m` exemplars of every class, compacting in place."""
+        position = 0
+        for class_idx, (start, count) in self._slots.items():
+            count = min(count, m)
+            # Slots only move left, and NumPy handles the overlapping copy.
+            for array in (self._data, self._targets, self._vectors, self._scales):
+                if array is not None:
+                    array[position : position + count] = array[start : start + count]
+            self._slots[class_idx] = (position, count)
+            position += count
+        self._size = position
+
+    def save(self, directory):
+        """Write the memory to `directory`, replacing it atomically."""
+        tmp = "{}.tmp-{}".format(directory.rstrip(os.sep), os.getpid())
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "data.npy"), self.encoded)
+        np.save(os.path.join(tmp, "targets.npy"), self.targets)
+        if self.vectors is not None:
+            np.save(os.path.join(tmp, "vectors.npy"), self._vectors[: self._size])
+        if self._scales is not None:
+            np.save(os.path.join(tmp, "scales.npy"), self._scales[: self._size])
+        index = {
+            "size": self._size,
+            "capacity": self.capacity,
+            "codec": self.codec.config(),
+            "vector_dtype": self.vector_dtype,
+            "slots": [
+                [int(class_idx), start, count]
+                for class_idx, (start, count) in self._slots.items()
+            ],
+        }
+        with open(os.path.join(tmp, "index.json"), "w") as f:
+            json.dump(index, f)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.rename(tmp, directory)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="c"):
+        """
+        Memory-map a saved memory. With the default copy-on-write mode the
+        memory can still be reduced and extended without touching the files;
+        ``mmap_mode="r"`` gives a strictly read-only view.
+        """
+        with open(os.path.join(directory, "index.json")) as f:
+            index = json.load(f)
+        memory = cls(
+            index["capacity"], get_codec(**index["codec"]), index["vector_dtype"]
+        )
+        memory._size = index["size"]
+        memory._slots = {
+            class_idx: (start, count) for class_idx, start, count in index["slots"]
+        }
+        if memory._size == 0:
+            return memory
+        memory.capacity = memory._size
+        memory._data = np.load(os.path.join(directory, "data.npy"), mmap_mode=mmap_mode)
+        memory._targets = np.load(
+            os.path.join(directory, "targets.npy"), mmap_mode=mmap_mode
+        )
+        for name in ("vectors", "scales"):
+            path = os.path.join(directory, name + ".npy")
+            if os.path.exists(path):
+                setattr(memory, "_" + name, np.load(path, mmap_mode=mmap_mode))
+        return memory
+
+    def _reserve(self, size, data, vectors):
+        if self._data is None:
+            self._data = np.empty((self.capacity,) + data.shape[1:], dtype=data.dtype)
+            self._targets = np.empty(self.capacity, dtype=np.int64)
+            if vectors is not None:
+                self._allocate_vectors(np.shape(vectors)[1])
+        dtype = np.promote_types(self._data.dtype, data.dtype)
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        if capacity == self.capacity and dtype == self._data.dtype:
+            return
+        # Longer path strings, or more exemplars than planned.
+        self._data = _resized(self._data, capacity, dtype, self._size)
+        self._targets = _resized(self._targets, capacity, self._targets.dtype, self._size)
+        for name in ("_vectors", "_scales"):
+            array = getattr(self, name)
+            if array is not None:
+                setattr(self, name, _resized(array, capacity, array.dtype, self._size))
+        self.capacity = capacity
+
+
+def _resized(array, capacity, dtype, size):
+    out = np.empty((capacity,) + array.shape[1:], dtype=dtype)
+    out[:size] = array[:size]
+    return out
@@ -0,0 +1,170 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+
+
+def herding(vectors, m, device="cpu"):
+    """
+    iCaRL herding on the (L2-normalized) features `vectors` [n, d] of one
+    class: the index of each of the min(m, n) exemplars, in selection order.
+    """
+    return herding_batch([vectors], m, device)[0]
+
+
+def select(strategy, vectors_list, m, device="cpu", max_elements=2**26, workers=1):
+    """
+    Pick min(m, n) exemplars for each class of `vectors_list` with one of
+    SELECTION_STRATEGIES, logging the time it took. Returns one index array
+    per class, in selection order.
+
+    With `workers` > 1 the classes are split over that many threads (capped by
+    the number of classes); the tensor kernels release the GIL, so the shares
+    run concurrently. Each kernel also uses torch's intra-op threads, so keep
+    `workers` times torch.get_num_threads() within the cores.
+    """
+    if strategy not in SELECTION_STRATEGIES:
+        raise NotImplementedError("Unknown selection strategy {}.".format(strategy))
+    start = time.perf_counter()
+    workers = max(1, min(workers, len(vectors_list)))
+    if workers == 1:
+        picks = _grouped(
+            SELECTION_STRATEGIES[strategy], vectors_list, m, device, max_elements
+        )
+    else:
+        picks = _parallel(
+            SELECTION_STRATEGIES[strategy], vectors_list, m, device, max_elements, workers
+        )
+    logging.info(
+        "Selected exemplars for {} classes with {} in {:.3f}s ({} workers)".format(
+            len(vectors_list), strategy, time.perf_counter() - start, workers
+        )
+    )
+    return picks
+
+
+def _parallel(strategy, vectors_list, m, device, max_elements, workers):
+    # Deal classes out largest first so that the shares are balanced.
+    order = np.argsort([-len(vectors) for vectors in vectors_list], kind="stable")
+    shares = [order[k::workers] for k in range(workers)]
+    with ThreadPoolExecutor(workers) as executor:
+        results = executor.map(
+            lambda share: _grouped(
+                strategy,
+                [vectors_list[c] for c in share],
+                m,
+                device,
+                max_elements // workers,
+            ),
+            shares,
+        )
+        picks = [None] * len(vectors_list)
+        for share, share_picks in zip(shares, results):
+            for c, class_picks in zip(share, share_picks):
+                picks[c] = class_picks
+    return picks
+
+
+def herding_batch(vectors_list, m, device="cpu", max_elements=2**26):
+    """
+    Herding for several classes at once. Classes are padded to the largest
+    one and stepped together on `device`: each step keeps the running sum of
+    the chosen features and masks the chosen rows, so a step costs one
+    [classes, n, d] pass instead of re-summing and copying the class data.
+    Picks the same exemplars as the reference loop that deletes chosen rows.
+    """
+    return _grouped(_herding, vectors_list, m, device, max_elements)
+
+
+def _grouped(strategy, vectors_list, m, device, max_elements):
+    # Classes are grouped so that a group's padded features hold at most
+    # `max_elements` values, then padded and selected group by group.
+    picks, group, group_size = [], [], 0
+    for vectors in vectors_list:
+        size = max(group_size, len(vectors))
+        if group and (len(group) + 1) * size * vectors.shape[1] > max_elements:
+            picks.extend(_select_group(strategy, group, m, device))
+            group, size = [], len(vectors)
+        group.append(vectors)
+        group_size = size
+    if group:
+        picks.extend(_select_group(strategy, group, m, device))
+    return picks
+
+
+def _select_group(strategy, vectors_list, m, device):
+    sizes = [len(vectors) for vectors in vectors_list]
+    nb_classes, max_size = len(vectors_list), max(sizes)
+    dim = vectors_list[0].shape[1]
+
+    features = torch.zeros(nb_classes, max_size, dim, device=device)
+    available = torch.zeros(nb_classes, max_size, dtype=torch.bool, device=device)
+    for c, vectors in enumerate(vectors_list):
+        features[c, : sizes[c]] = torch.as_tensor(vectors, device=device).float()
+        available[c, : sizes[c]] = True
+    counts = torch.tensor(sizes, device=device).clamp(min=1).unsqueeze(1)
+    class_means = features.sum(dim=1) / counts  # padding rows are zero
+
+    picks = strategy(features, available, class_means, min(m, max_size))
+    picks = picks.cpu().numpy()
+    return [picks[c, : min(m, size)] for c, size in enumerate(sizes)]
+
+
+# Strategies take padded features [classes, n, d], the mask of real rows
+# [classes, n] and the class means [classes, d], and return [classes, m]
+# indices; entries past a class's size are dropped by the caller.
+
+
+def _herding(features, available, class_means, m):
+    available = available.clone()
+    rows = torch.arange(len(features), device=features.device)
+    running_sum = torch.zeros_like(class_means)
+    picks = torch.zeros(len(features), m, dtype=torch.long, device=features.device)
+    for k in range(1, m + 1):
+        mu_p = (features + running_sum.unsqueeze(1)) / k  # [classes, n, d]
+        dists = ((class_means.unsqueeze(1) - mu_p) ** 2).sum(dim=2)
+        dists.masked_fill_(~available, float("inf"))
+        i = dists.argmin(dim=1)
+        picks[:, k - 1] = i
+        running_sum += features[rows, i]
+        available[rows, i] = False
+    return picks
+
+
+def _random(features, available, class_means, m):
+    scores = torch.rand(available.shape, device=features.device)
+    scores.masked_fill_(~available, -1)
+    return scores.topk(m, dim=1).indices
+
+
+def _mean_distance(features, available, class_means, m):
+    # The m samples closest to their class mean, closest first.
+    dists = ((features - class_means.unsqueeze(1)) ** 2).sum(dim=2)
+    dists.masked_fill_(~available, float("inf"))
+    return dists.topk(m, dim=1, largest=False).indices
+
+
+def _kcenter(features, available, class_means, m):
+    # Greedy farthest-point selection, starting from the sample closest to
+    # the class mean.
+    rows = torch.arange(len(features), device=features.device)
+    picks = torch.zeros(len(features), m, dtype=torch.long, device=features.device)
+    i = _mean_distance(features, available, class_means, 1)[:, 0]
+    min_dists = torch.full(available.shape, float("inf"), device=features.device)
+    for k in range(m):
+        picks[:, k] = i
+        center = features[rows, i].unsqueeze(1)
+        min_dists = torch.minimum(min_dists, ((features - center) ** 2).sum(dim=2))
+        min_dists[rows, i] = -1
+        min_dists.masked_fill_(~available, -1)
+        i = min_dists.argmax(dim=1)
+    return picks
+
+
+SELECTION_STRATEGIES = {
+    "herding": _herding,
+    "random": _random,
+    "kcenter": _kcenter,
+    "mean_distance": _mean_distance,
+}
@@ -0,0 +1,132 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
+from PIL import Image
+
+
+class DecodedImageCache(object):
+    """Byte-bounded cache of decoded RGB images keyed by file path.
+
+    Each entry is a raw ``.npy`` array in a directory on tmpfs (``/dev/shm``
+    when available), so the cache is shared by every DataLoader worker and
+    survives across the loaders created for each task. When the budget is
+    exceeded the oldest entries are removed down to ``low_watermark`` of the
+    budget; with ``policy="lru"`` a hit refreshes the entry's age, with
+    ``policy="fifo"`` entries age from insertion only.
+    """
+
+    def __init__(self, loader, max_bytes, policy="lru", root=None, low_watermark=0.9):
+        if policy not in ("lru", "fifo"):
+            raise ValueError("Unknown cache policy {}.".format(policy))
+        if root is None:
+            root = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        self.loader = loader
+        self.max_bytes = int(max_bytes)
+        self.policy = policy
+        self.low_watermark = low_watermark
+        self.root = tempfile.mkdtemp(prefix="decoded_cache_", dir=root)
+        self._nbytes = multiprocessing.Value("q", 0)
+        self._finalizer = weakref.finalize(
+            self, _remove_cache_dir, self.root, os.getpid()
+        )
+        logging.info(
+            "Decoded image cache at {} ({} MB, {})".format(
+                self.root, self.max_bytes // 2**20, self.policy
+            )
+        )
+
+    @property
+    def nbytes(self):
+        return self._nbytes.value
+
+    def __call__(self, path):
+        entry = self._entry(path)
+        try:
+            array = np.load(entry)
+        except (FileNotFoundError, ValueError):
+            # Missing, or evicted / being replaced while we were reading it.
+            return self._insert(entry, self.loader(path))
+        if self.policy == "lru":
+            try:
+                os.utime(entry)
+            except FileNotFoundError:
+                pass
+        return Image.fromarray(array)
+
+    def clear(self):
+        with self._nbytes.get_lock():
+            for item in os.scandir(self.root):
+                _unlink(item.path)
+            self._nbytes.value = 0
+
+    def _entry(self, path):
+        key = hashlib.sha1(str(path).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, key + ".npy")
+
+    def _insert(self, entry, image):
+        array = np.asarray(image)
+        if array.nbytes > self.max_bytes:
+            return image
+        tmp = "{}.{}.tmp".format(entry, os.getpid())
+        with open(tmp, "wb") as f:
+            np.save(f, array)
+        try:
+            # Hard-link so that a concurrent insert of the same path by another
+            # worker is detected and not counted twice.
+            os.link(tmp, entry)
+            added = os.path.getsize(entry)
+        except FileExistsError:
+            added = 0
+        finally:
+            _unlink(tmp)
+
+        if added:
+            with self._nbytes.get_lock():
+                self._nbytes.value += added
+                if self._nbytes.value > self.max_bytes:
+                    self._evict()
+        return image
+
+    def _evict(self):
+        entries = []
+        for item in os.scandir(self.root):
+            if not item.name.endswith(".npy"):
+                continue
+            try:
+                stat = item.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, item.path))
+        entries.sort()
+
+        target = int(self.max_bytes * self.low_watermark)
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            _unlink(path)
+            total -= size
+        self._nbytes.value = total
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_finalizer", None)
+        return state
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _remove_cache_dir(root, owner_pid):
+    # Forked DataLoader workers inherit the finalizer; only the creator cleans up.
+    if os.getpid() == owner_pid:
+        shutil.rmtree(root, ignore_errors=True)
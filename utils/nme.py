@@ -0,0 +1,48 @@
+import torch
+import torch.nn.functional as F
+
+
+class NMEClassifier(object):
+    """
+    Nearest-class-mean classifier on L2-normalized features. The class means
+    stay resident on `device` as one [nb_classes, d] matrix; samples are
+    scored against it with a matmul, ``chunk_size`` rows at a time, so
+    scoring needs O(chunk_size * nb_classes) memory whatever the number of
+    samples.
+
+    For unit vectors the squared distance is ``2 - 2 cos``; it is computed
+    as ``|c|^2 - 2 v.c`` (the constant ``|v|^2`` dropped), which also ranks
+    the all-zero means of classes without exemplars as cdist does.
+    """
+
+    def __init__(self, class_means, device="cpu", chunk_size=4096):
+        if isinstance(class_means, (list, tuple)):
+            class_means = torch.stack([torch.as_tensor(m) for m in class_means])
+        self._means = torch.as_tensor(class_means).float().to(device)
+        self._sq_norms = (self._means ** 2).sum(dim=1)
+        self.device = device
+        self.chunk_size = chunk_size
+
+    @property
+    def nb_classes(self):
+        return len(self._means)
+
+    def distances(self, vectors):
+        """Squared distances (up to a per-sample constant) of normalized `vectors`."""
+        return torch.addmm(self._sq_norms, vectors, self._means.T, alpha=-2)
+
+    def predict(self, vectors, k=1):
+        """
+        The `k` nearest classes of each row of `vectors` (raw features, a
+        tensor or array), nearest first, as a [n, k] tensor on `device`.
+        """
+        vectors = torch.as_tensor(vectors)
+        k = min(k, self.nb_classes)
+        predicts = []
+        for start in range(0, len(vectors), self.chunk_size):
+            chunk = vectors[start : start + self.chunk_size].to(self.device).float()
+            dists = self.distances(F.normalize(chunk, p=2, dim=1))
+            predicts.append(dists.topk(k, dim=1, largest=False, sorted=True)[1])
+        if len(predicts) == 0:
+            return torch.zeros(0, k, dtype=torch.long, device=self.device)
+        return torch.cat(predicts)
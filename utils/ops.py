@@ -2,6 +2,9 @@ from PIL import Image, ImageEnhance, ImageOps
 import random
 import torch
 import numpy as np
+from torch.nn import functional as F
+
+
 class Cutout(object):
     def __init__(self, n_holes, length):
         self.n_holes = n_holes
@@ -119,3 +122,187 @@ class Equalize(object):
 class Invert(object):
     def __call__(self, x, magnitude):
         return ImageOps.invert(x)
+
+
+# Batched tensor versions of the ops above. They work on float batches
+# [B, C, H, W] in [0, 1] (i.e. after ToTensor, before Normalize) on any
+# device, and take one magnitude per sample; the random sign drawn inside
+# the PIL ops is folded into the magnitude by the caller.
+
+def _to_uint8(x):
+    return (x * 255).round().clamp(0, 255).to(torch.uint8)
+
+
+def _from_uint8(x):
+    return x.float() / 255
+
+
+def _blend(degenerate, x, factor):
+    return (degenerate + factor.view(-1, 1, 1, 1) * (x - degenerate)).clamp(0, 1)
+
+
+def _grayscale(x):
+    return (0.299 * x[:, 0:1] + 0.587 * x[:, 1:2] + 0.114 * x[:, 2:3])
+
+
+def _affine(x, matrix, fill, mode="bilinear"):
+    # `matrix` [B, 3, 3] maps output pixel coordinates to input pixel
+    # coordinates like PIL's Image.transform(Image.AFFINE, ...).
+    b, _, h, w = x.shape
+    to_norm = x.new_tensor([[2 / w, 0, 1 / w - 1], [0, 2 / h, 1 / h - 1], [0, 0, 1]])
+    theta = to_norm @ matrix @ torch.linalg.inv(to_norm)
+    grid = F.affine_grid(theta[:, :2], list(x.shape), align_corners=False)
+    # Sample an extra ones-channel to know which pixels came from outside.
+    padded = torch.cat([x, x.new_ones(b, 1, h, w)], dim=1)
+    out = F.grid_sample(padded, grid, mode=mode, padding_mode="zeros", align_corners=False)
+    inside = out[:, -1:]
+    fill = x.new_tensor(fill).view(1, -1, 1, 1) / 255
+    return out[:, :-1] + (1 - inside) * fill
+
+
+def _eye(x):
+    return torch.eye(3, device=x.device, dtype=x.dtype).repeat(x.shape[0], 1, 1)
+
+
+def batch_shear_x(x, magnitude, fill):
+    matrix = _eye(x)
+    matrix[:, 0, 1] = magnitude
+    return _affine(x, matrix, fill, mode="bicubic").clamp(0, 1)
+
+
+def batch_shear_y(x, magnitude, fill):
+    matrix = _eye(x)
+    matrix[:, 1, 0] = magnitude
+    return _affine(x, matrix, fill, mode="bicubic").clamp(0, 1)
+
+
+def batch_translate_x(x, magnitude, fill):
+    matrix = _eye(x)
+    matrix[:, 0, 2] = magnitude * x.shape[3]
+    return _affine(x, matrix, fill, mode="nearest")
+
+
+def batch_translate_y(x, magnitude, fill):
+    matrix = _eye(x)
+    matrix[:, 1, 2] = magnitude * x.shape[2]
+    return _affine(x, matrix, fill, mode="nearest")
+
+
+def batch_rotate(x, magnitude, fill):
+    # Counter-clockwise by `magnitude` degrees around the image centre.
+    h, w = x.shape[2:]
+    angle = torch.deg2rad(magnitude.to(x.dtype))
+    cos, sin = torch.cos(angle), torch.sin(angle)
+    cx, cy = w / 2, h / 2
+    matrix = _eye(x)
+    matrix[:, 0, 0], matrix[:, 0, 1] = cos, -sin
+    matrix[:, 1, 0], matrix[:, 1, 1] = sin, cos
+    matrix[:, 0, 2] = cx - cos * cx + sin * cy
+    matrix[:, 1, 2] = cy - sin * cx - cos * cy
+    return _affine(x, matrix, (128, 128, 128), mode="nearest")
+
+
+def batch_color(x, magnitude, fill):
+    return _blend(_grayscale(x), x, 1 + magnitude)
+
+
+def batch_contrast(x, magnitude, fill):
+    mean = (_grayscale(x) * 255).round().mean(dim=(1, 2, 3), keepdim=True)
+    return _blend((mean + 0.5).floor() / 255, x, 1 + magnitude)
+
+
+def batch_brightness(x, magnitude, fill):
+    return _blend(torch.zeros_like(x), x, 1 + magnitude)
+
+
+def batch_sharpness(x, magnitude, fill):
+    kernel = x.new_tensor([[1, 1, 1], [1, 5, 1], [1, 1, 1]]) / 13
+    kernel = kernel.expand(x.shape[1], 1, 3, 3)
+    smooth = F.conv2d(x, kernel, groups=x.shape[1])
+    # PIL leaves the one-pixel border unfiltered.
+    degenerate = x.clone()
+    degenerate[:, :, 1:-1, 1:-1] = smooth
+    return _blend(degenerate, x, 1 + magnitude)
+
+
+def batch_posterize(x, magnitude, fill):
+    shift = (8 - magnitude.long()).view(-1, 1, 1, 1)
+    q = _to_uint8(x).long()
+    return _from_uint8((q >> shift) << shift)
+
+
+def batch_solarize(x, magnitude, fill):
+    q = _to_uint8(x).float()
+    threshold = magnitude.to(q.dtype).view(-1, 1, 1, 1)
+    return _from_uint8(torch.where(q >= threshold, 255 - q, q))
+
+
+def batch_autocontrast(x, magnitude, fill):
+    q = _to_uint8(x).float()
+    low = q.amin(dim=(2, 3), keepdim=True)
+    high = q.amax(dim=(2, 3), keepdim=True)
+    scale = 255 / (high - low).clamp(min=1)
+    out = ((q - low) * scale).floor().clamp(0, 255)
+    return _from_uint8(torch.where(high > low, out, q))
+
+
+def batch_equalize(x, magnitude, fill):
+    # Per-channel histogram equalization with PIL's lookup table.
+    b, c, h, w = x.shape
+    q = _to_uint8(x).long().view(b * c, h * w)
+    hist = torch.zeros(b * c, 256, device=x.device, dtype=torch.long)
+    hist.scatter_add_(1, q, torch.ones_like(q))
+    last = 255 - torch.argmax((hist.flip(1) > 0).long(), dim=1, keepdim=True)
+    step = (h * w - hist.gather(1, last)) // 255
+    before = torch.cumsum(hist, dim=1) - hist
+    lut = ((step // 2 + before) // step.clamp(min=1)).clamp(0, 255)
+    identity = torch.arange(256, device=x.device).expand_as(lut)
+    lut = torch.where(step > 0, lut, identity)
+    return _from_uint8(lut.gather(1, q).view(b, c, h, w))
+
+
+def batch_invert(x, magnitude, fill):
+    return 1 - x
+
+
+# name -> (batched op, whether the PIL op draws a random sign)
+BATCH_OPS = {
+    "shearX": (batch_shear_x, True),
+    "shearY": (batch_shear_y, True),
+    "translateX": (batch_translate_x, True),
+    "translateY": (batch_translate_y, True),
+    "rotate": (batch_rotate, True),
+    "color": (batch_color, True),
+    "posterize": (batch_posterize, False),
+    "solarize": (batch_solarize, False),
+    "contrast": (batch_contrast, True),
+    "sharpness": (batch_sharpness, True),
+    "brightness": (batch_brightness, True),
+    "autocontrast": (batch_autocontrast, False),
+    "equalize": (batch_equalize, False),
+    "invert": (batch_invert, False),
+}
+
+
+class BatchCutout(object):
+    """Cutout for a batch [B, C, H, W]; holes are drawn per sample."""
+
+    def __init__(self, n_holes, length):
+        self.n_holes = n_holes
+        self.length = length
+
+    def __call__(self, img):
+        b, _, h, w = img.shape
+        y = torch.randint(h, (b, self.n_holes, 1, 1), device=img.device)
+        x = torch.randint(w, (b, self.n_holes, 1, 1), device=img.device)
+        ys = torch.arange(h, device=img.device).view(1, 1, h, 1)
+        xs = torch.arange(w, device=img.device).view(1, 1, 1, w)
+        half = self.length // 2
+        inside = (
+            (ys >= (y - half).clamp(0, h))
+            & (ys < (y + half).clamp(0, h))
+            & (xs >= (x - half).clamp(0, w))
+            & (xs < (x + half).clamp(0, w))
+        )
+        mask = (~inside.any(dim=1, keepdim=True)).to(img.dtype)
+        return img * mask
@@ -0,0 +1,96 @@
+import time
+import torch
+
+
+class PrefetchStats(object):
+    """Time the consumer spent blocked waiting for batches, summed over loaders."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stall_time = 0.0
+        self.total_time = 0.0
+        self.batches = 0
+
+    def __str__(self):
+        ratio = self.stall_time / self.total_time if self.total_time > 0 else 0.0
+        return "data stall {:.1f}s of {:.1f}s ({:.1%}) over {} batches".format(
+            self.stall_time, self.total_time, ratio, self.batches
+        )
+
+
+class DevicePrefetcher(object):
+    """
+    Wrap a DataLoader so that batch k+1 is copied host->device on a side CUDA
+    stream while the caller computes on batch k. The loader should use
+    pin_memory=True for the copies to be asynchronous. Every tensor in the
+    batch tuple is moved; on a non-CUDA device batches are moved synchronously.
+    """
+
+    def __init__(self, loader, device, stats=None):
+        self.loader = loader
+        self.device = torch.device(device)
+        self.stats = stats if stats is not None else PrefetchStats()
+
+    def __len__(self):
+        return len(self.loader)
+
+    @property
+    def dataset(self):
+        return self.loader.dataset
+
+    @property
+    def batch_size(self):
+        return self.loader.batch_size
+
+    def __iter__(self):
+        self._last = time.perf_counter()
+        iterator = iter(self.loader)
+        if self.device.type != "cuda":
+            while True:
+                batch = self._next(iterator)
+                if batch is None:
+                    return
+                yield _move(batch, self.device, non_blocking=False)
+
+        stream = torch.cuda.Stream(self.device)
+        next_batch = self._preload(iterator, stream)
+        while next_batch is not None:
+            current = torch.cuda.current_stream(self.device)
+            current.wait_stream(stream)
+            batch = next_batch
+            for item in batch:
+                if isinstance(item, torch.Tensor):
+                    # The tensor was allocated on the side stream.
+                    item.record_stream(current)
+            next_batch = self._preload(iterator, stream)
+            yield batch
+
+    def _preload(self, iterator, stream):
+        batch = self._next(iterator)
+        if batch is None:
+            return None
+        with torch.cuda.stream(stream):
+            return _move(batch, self.device, non_blocking=True)
+
+    def _next(self, iterator):
+        start = time.perf_counter()
+        try:
+            batch = next(iterator)
+        except StopIteration:
+            batch = None
+        end = time.perf_counter()
+        self.stats.stall_time += end - start
+        self.stats.total_time += end - self._last
+        self._last = end
+        if batch is not None:
+            self.stats.batches += 1
+        return batch
+
+
+def _move(batch, device, non_blocking):
+    return type(batch)(
+        item.to(device, non_blocking=non_blocking) if isinstance(item, torch.Tensor) else item
+        for item in batch
+    )
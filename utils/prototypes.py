@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class PrototypeStore(object):
+    """
+    Per-class running sums and counts of normalized exemplar features, for
+    NME class means. `version` records the network (branch fingerprints)
+    the features came from; while it holds, exemplars can be added or
+    removed without touching the other samples of a class.
+    """
+
+    def __init__(self):
+        self.reset(None)
+
+    def reset(self, version):
+        self.version = version
+        self._sums, self._counts = {}, {}
+
+    def add(self, class_idx, vectors):
+        if len(vectors) == 0:
+            return
+        self._sums[class_idx] = self._sums.get(class_idx, 0) + vectors.sum(axis=0)
+        self._counts[class_idx] = self._counts.get(class_idx, 0) + len(vectors)
+
+    def add_segments(self, classes, vectors, counts, mask=None, sign=1):
+        """
+        Add (or, with ``sign=-1``, remove) consecutive segments of `vectors`,
+        `counts[i]` rows for `classes[i]`, with one segmented reduction. Only
+        rows where `mask` is true take part.
+        """
+        counts = np.asarray(counts)
+        nonempty = counts > 0
+        if not nonempty.any():
+            return
+        if mask is None:
+            mask = np.ones(len(vectors), dtype=bool)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+        sums = np.add.reduceat(vectors * mask[:, None], starts, axis=0)
+        taken = np.add.reduceat(mask.astype(np.int64), starts)
+        for class_idx, total, count in zip(np.asarray(classes)[nonempty], sums, taken):
+            if count == 0:
+                continue
+            self._sums[class_idx] = self._sums.get(class_idx, 0) + sign * total
+            self._counts[class_idx] = self._counts.get(class_idx, 0) + sign * count
+
+    def means(self, nb_classes, dim):
+        """[nb_classes, dim] normalized class means; zero for unknown classes."""
+        means = np.zeros((nb_classes, dim))
+        for class_idx, total in self._sums.items():
+            if class_idx < nb_classes and self._counts[class_idx] > 0:
+                mean = total / self._counts[class_idx]
+                means[class_idx, :] = mean / np.linalg.norm(mean)
+        return means
@@ -0,0 +1,76 @@
+import random
+from contextlib import contextmanager
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+
+def stream_key(*counters):
+    """Stateless 63-bit key for a tuple of counters, e.g. (seed, task, loader, epoch, sample)."""
+    state = np.random.SeedSequence([int(c) for c in counters]).generate_state(2, np.uint32)
+    return (int(state[0]) << 31) ^ int(state[1])
+
+
+@contextmanager
+def seeded(key):
+    """Run a block with the torch, numpy and python RNGs seeded from `key`, then restore them."""
+    torch_state = torch.get_rng_state()
+    np_state = np.random.get_state()
+    py_state = random.getstate()
+    torch.manual_seed(key)
+    np.random.seed(key % 2**32)
+    random.seed(key)
+    try:
+        yield
+    finally:
+        torch.set_rng_state(torch_state)
+        np.random.set_state(np_state)
+        random.setstate(py_state)
+
+
+class DeterministicSampler(Sampler):
+    """
+    Counter-based sampler: the order of an epoch depends only on
+    (seed, task, loader, epoch), and each sample is yielded as
+    ``(index, key)`` where ``key`` is derived from (..., epoch, index) and seeds
+    that sample's augmentation. Any batch can therefore be regenerated,
+    cached, or replayed, and ``set_epoch(epoch, start)`` resumes an epoch at
+    sample `start`. Each call to ``__iter__`` starts a new epoch.
+    """
+
+    def __init__(self, data_source, seed, task=0, loader=0, shuffle=True):
+        self.data_source = data_source
+        self.seed = seed
+        self.task = task
+        self.loader = loader
+        self.shuffle = shuffle
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch, start=0):
+        self.epoch = epoch
+        self.start = start
+
+    def state_dict(self):
+        return {"epoch": self.epoch, "start": self.start}
+
+    def load_state_dict(self, state):
+        self.set_epoch(state["epoch"], state["start"])
+
+    def __len__(self):
+        return len(self.data_source) - self.start
+
+    def __iter__(self):
+        epoch, start = self.epoch, self.start
+        self.epoch, self.start = epoch + 1, 0
+
+        n = len(self.data_source)
+        if self.shuffle:
+            generator = torch.Generator()
+            generator.manual_seed(stream_key(self.seed, self.task, self.loader, epoch))
+            order = torch.randperm(n, generator=generator).tolist()
+        else:
+            order = range(n)
+        for position in range(start, n):
+            idx = order[position]
+            yield idx, stream_key(self.seed, self.task, self.loader, epoch, idx)
@@ -24,6 +24,15 @@ def count_parameters(model, trainable=False):
     return sum(p.numel() for p in model.parameters())
 
 
+def network_fingerprint(model):
+    # Changes whenever a parameter or buffer is updated in place (optimizer
+    # steps, BN statistics), replaced, or moved to another device.
+    return tuple(
+        (tensor.data_ptr(), tensor._version)
+        for tensor in list(model.parameters()) + list(model.buffers())
+    )
+
+
 def tensor2numpy(x):
     return x.cpu().data.numpy() if x.is_cuda else x.data.numpy()
 
@@ -88,6 +97,23 @@ def accuracy(y_pred, y_true, nb_old, init_cls=10, increment=10):
     return all_acc
 
 
+def confusion_counts(y_pred, y_true, nb_classes, device="cpu"):
+    # [nb_classes, nb_classes] counts, rows true and columns predicted labels,
+    # with one bincount.
+    y_pred = torch.as_tensor(y_pred, device=device).long()
+    y_true = torch.as_tensor(y_true, device=device).long()
+    counts = torch.bincount(y_true * nb_classes + y_pred, minlength=nb_classes ** 2)
+    return counts.view(nb_classes, nb_classes).cpu().numpy()
+
+
+def class_tasks(nb_classes, init_cls=10, increment=10):
+    # Task index of each class: init_cls classes first, then increment per task.
+    classes = np.arange(nb_classes)
+    return np.where(
+        classes < init_cls, 0, 1 + (classes - init_cls) // max(increment, 1)
+    )
+
+
 def split_images_labels(imgs):
     # split trainset.imgs in ImageFolder
     images = []
@@ -0,0 +1,147 @@
+import copy
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, Subset
+from utils.prefetch import DevicePrefetcher, PrefetchStats
+
+
+class AsyncValidator(object):
+    """
+    Periodic test accuracy during training that does not stop training.
+
+    `due(epoch)` is true every `interval` epochs. `submit` copies the weights
+    of the model into a snapshot network and evaluates the snapshot with
+    `evaluate(model, loader)` (e.g. ``BaseLearner._compute_accuracy``) on a
+    background thread, on a separate CUDA stream, while training continues;
+    ``"<info>, Test_accy <acc>"`` is logged when the result is ready. At most
+    one evaluation is in flight: a new submission first waits for the
+    previous one, which then frees the snapshot for reuse.
+
+    With ``subset="stratified"`` only `per_class` samples of each class
+    (drawn once per test loader with `seed`) are evaluated. ``asynchronous=False``
+    evaluates in the caller, as before. Batches prefetched for validation
+    are counted in `stats`, apart from the training loaders' stall report.
+    """
+
+    def __init__(
+        self,
+        evaluate,
+        device,
+        interval=5,
+        subset="full",
+        per_class=10,
+        asynchronous=True,
+        seed=0,
+    ):
+        assert subset in ("full", "stratified"), "Unknown validation subset."
+        self.evaluate = evaluate
+        self.device = torch.device(device)
+        self.interval = interval
+        self.subset = subset
+        self.per_class = per_class
+        self.asynchronous = asynchronous
+        self.seed = seed
+        self._executor = ThreadPoolExecutor(1) if asynchronous else None
+        self._stream = (
+            torch.cuda.Stream(self.device)
+            if asynchronous and self.device.type == "cuda"
+            else None
+        )
+        self._pending = None
+        self._snapshot, self._layout = None, None
+        self._loaders = (None, None)  # (test loader, the loader validating it)
+        self.stats = PrefetchStats()
+
+    def due(self, epoch):
+        return self.interval > 0 and epoch % self.interval == self.interval - 1
+
+    def submit(self, model, loader, info):
+        loader = self._loader(loader)
+        if not self.asynchronous:
+            self._log(info, self.evaluate(model, loader))
+            return
+        self.wait()
+        snapshot = self._take_snapshot(model)
+        ready = None
+        if self._stream is not None:
+            # The snapshot copies are queued on the training stream.
+            ready = torch.cuda.Event()
+            ready.record(torch.cuda.current_stream(self.device))
+        self._pending = self._executor.submit(self._run, snapshot, loader, info, ready)
+
+    def wait(self):
+        """Block until the evaluation in flight (if any) is logged."""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def _run(self, snapshot, loader, info, ready):
+        if self._stream is None:
+            self._log(info, self.evaluate(snapshot, loader))
+            return
+        with torch.cuda.stream(self._stream):
+            self._stream.wait_event(ready)
+            self._log(info, self.evaluate(snapshot, loader))
+
+    def _log(self, info, test_acc):
+        logging.info("{}, Test_accy {:.2f}".format(info, test_acc))
+
+    def _take_snapshot(self, model):
+        if isinstance(model, nn.DataParallel):
+            model = model.module
+        state = model.state_dict()
+        layout = [(key, value.shape, value.dtype) for key, value in state.items()]
+        with torch.no_grad():
+            if layout != self._layout:
+                # New architecture (e.g. a grown fc): copy the whole module.
+                self._snapshot = copy.deepcopy(model).requires_grad_(False)
+                for parameter in self._snapshot.parameters():
+                    parameter.grad = None
+                self._layout = layout
+            else:
+                for target, value in zip(self._snapshot.state_dict().values(), state.values()):
+                    target.copy_(value, non_blocking=True)
+        return self._snapshot.eval()
+
+    def _loader(self, loader):
+        if self._loaders[0] is not loader:
+            self._loaders = (loader, self._validation_loader(loader))
+        return self._loaders[1]
+
+    def _validation_loader(self, loader):
+        prefetch_device = None
+        if isinstance(loader, DevicePrefetcher):
+            loader, prefetch_device = loader.loader, loader.device
+        if self.subset == "stratified":
+            loader = self._stratified(loader)
+        if prefetch_device is not None:
+            loader = DevicePrefetcher(loader, prefetch_device, self.stats)
+        return loader
+
+    def _stratified(self, loader):
+        targets = getattr(loader.dataset, "targets", None)
+        if targets is None:
+            logging.warning("Cannot stratify a streaming test set; validating on all of it.")
+            return loader
+        rng = np.random.RandomState(self.seed)
+        rows = []
+        for class_idx in np.unique(targets):
+            class_rows = np.where(targets == class_idx)[0]
+            rows.append(
+                rng.choice(class_rows, min(self.per_class, len(class_rows)), replace=False)
+            )
+        rows = np.sort(np.concatenate(rows))
+        logging.info(
+            "Validating on {} of {} test samples ({} per class)".format(
+                len(rows), len(targets), self.per_class
+            )
+        )
+        return DataLoader(
+            Subset(loader.dataset, rows),
+            batch_size=loader.batch_size,
+            num_workers=loader.num_workers,
+            pin_memory=loader.pin_memory,
+        )